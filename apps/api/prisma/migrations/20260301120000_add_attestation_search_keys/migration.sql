@@ -0,0 +1,26 @@
+-- Search keys precomputed by scripts/parser_attestation.py (search_keys); trigram index for contains/ILIKE.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- AlterTable
+ALTER TABLE "attestation_people" ADD COLUMN "full_name_search" TEXT,
+ADD COLUMN "name_tokens" TEXT[] DEFAULT ARRAY[]::TEXT[];
+
+-- Backfill rows loaded before this migration (same rules as the parser: first three words, distinct words in order)
+UPDATE "attestation_people" SET
+    "full_name_search" = array_to_string((regexp_split_to_array(btrim("full_name_normalized"), '\s+'))[1:3], ' '),
+    "name_tokens" = ARRAY(
+        SELECT t.word
+        FROM unnest(regexp_split_to_array(btrim("full_name_normalized"), '\s+')) WITH ORDINALITY AS t(word, pos)
+        WHERE t.word <> ''
+        GROUP BY t.word
+        ORDER BY min(t.pos)
+    );
+
+-- CreateIndex
+CREATE INDEX "idx_attestation_name_trgm" ON "attestation_people" USING GIN ("full_name_normalized" gin_trgm_ops);
+
+-- CreateIndex
+CREATE INDEX "idx_attestation_tokens" ON "attestation_people" USING GIN ("name_tokens");
+
+-- CreateIndex
+CREATE INDEX "idx_attestation_search" ON "attestation_people"("full_name_search");
@@ -0,0 +1,10 @@
+-- Transliteration key (name_key in scripts/parser_attestation.py, nameKey in normalize.ts).
+-- Existing rows are backfilled by the parser on its next run (backfill_name_keys).
+-- AlterTable
+ALTER TABLE "attestation_people" ADD COLUMN "name_key" TEXT;
+
+-- CreateIndex
+CREATE INDEX "idx_attestation_name_key" ON "attestation_people"("name_key");
+
+-- CreateIndex
+CREATE INDEX "idx_attestation_name_key_trgm" ON "attestation_people" USING GIN ("name_key" gin_trgm_ops);
@@ -0,0 +1,29 @@
+-- exam_date/exam_time were stored as the raw "dd.mm.yyyy" / "HH:MM" cells, so ORDER BY exam_date
+-- sorted by day of month. Convert them to DATE/TIME; cells that are not a valid date or time become NULL
+-- (the parser applies the same rules on ingest: parse_exam_date/parse_exam_time).
+CREATE FUNCTION pg_temp.attestation_exam_date(value TEXT) RETURNS DATE AS $$
+BEGIN
+    RETURN to_date(substring(value FROM '\d{1,2}\.\d{1,2}\.\d{4}'), 'DD.MM.YYYY');
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- TIME also accepts 24:00, parse_exam_time does not: hours above 23 become NULL here too.
+CREATE FUNCTION pg_temp.attestation_exam_time(value TEXT) RETURNS TIME AS $$
+DECLARE
+    hhmm TEXT := substring(value FROM '\m\d{1,2}:\d{2}\M');
+BEGIN
+    IF split_part(hhmm, ':', 1)::INT > 23 THEN
+        RETURN NULL;
+    END IF;
+    RETURN hhmm::TIME(6);
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- AlterTable
+ALTER TABLE "attestation_people"
+    ALTER COLUMN "exam_date" TYPE DATE USING pg_temp.attestation_exam_date("exam_date"),
+    ALTER COLUMN "exam_time" TYPE TIME(6) USING pg_temp.attestation_exam_time("exam_time");
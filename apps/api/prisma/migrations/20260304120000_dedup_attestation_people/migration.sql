@@ -0,0 +1,18 @@
+-- One row per listed person: (full_name_normalized, specialty, stage, profession, exam_date), the key the
+-- parser deduplicates on (dedup_key in scripts/parser_attestation.py). source_urls lists every post that
+-- names the person; source_url stays the first of them.
+-- AlterTable
+ALTER TABLE "attestation_people" ADD COLUMN "source_urls" TEXT[] DEFAULT ARRAY[]::TEXT[];
+
+-- Collapse existing repeats into the earliest loaded row of each person
+UPDATE "attestation_people" p SET "source_urls" = g.urls
+FROM (
+    SELECT
+        (array_agg("id" ORDER BY "created_at", "id"))[1] AS keep_id,
+        array_agg(DISTINCT "source_url") AS urls
+    FROM "attestation_people"
+    GROUP BY "full_name_normalized", "specialty", "stage", "profession", "exam_date"
+) g
+WHERE p."id" = g.keep_id;
+
+DELETE FROM "attestation_people" WHERE "source_urls" = ARRAY[]::TEXT[];
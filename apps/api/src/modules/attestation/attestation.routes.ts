@@ -1,23 +1,106 @@
 import { Router, Request, Response } from 'express';
+import { Prisma } from '@prisma/client';
+import http from 'http';
 import path from 'path';
 import { spawn } from 'child_process';
 import { prisma } from '../../db/prisma';
-import { normalizeName, firstThreeWords } from './normalize';
+import { normalizeName, firstThreeWords, nameKey, nameTokens } from './normalize';
 
 const router = Router();
 
 /** Project root (exam-platform): from .../modules/attestation up to repo root */
 const PROJECT_ROOT = path.resolve(__dirname, '..', '..', '..', '..', '..');
 const PARSER_TIMEOUT_MS = 900_000; // 15 min
+/** Resident parser (`parser_attestation.py --serve ...`): http://127.0.0.1:8765 or unix:/path/attestation.sock */
+const WORKER_URL = (process.env.ATTESTATION_WORKER_URL || '').trim();
+const TIMEOUT_HINT =
+  'Загрузка данных заняла слишком много времени. Запустите на сервере: python3 scripts/parser_attestation.py (или настройте cron в 06:00).';
+const WORKER_DOWN_HINT =
+  'Воркер обновления недоступен. Запустите на сервере: python3 scripts/parser_attestation.py (или настройте cron в 06:00).';
 
-function runParserOnce(): Promise<{ ok: boolean; hint?: string }> {
+/** started: the resident worker accepted a refresh job, the data is not loaded yet. */
+type ParserResult = { ok: boolean; hint?: string; started?: boolean };
+type WorkerJob = { id: number; state: 'running' | 'finished'; status: string | null };
+
+function workerRequest<T>(method: 'GET' | 'POST', urlPath: string): Promise<T> {
+  let target: http.RequestOptions;
+  if (WORKER_URL.startsWith('unix:')) {
+    target = { socketPath: WORKER_URL.slice('unix:'.length) };
+  } else {
+    const url = new URL(WORKER_URL);
+    target = { hostname: url.hostname, port: url.port };
+  }
+  return new Promise((resolve, reject) => {
+    const req = http.request(
+      { ...target, method, path: urlPath, timeout: 10_000, headers: { 'Content-Length': 0 } },
+      (res) => {
+        const chunks: Buffer[] = [];
+        res.on('data', (chunk: Buffer) => chunks.push(chunk));
+        res.on('end', () => {
+          if ((res.statusCode ?? 0) >= 400) {
+            reject(new Error(`worker HTTP ${res.statusCode}`));
+            return;
+          }
+          try {
+            resolve(JSON.parse(Buffer.concat(chunks).toString('utf8')) as T);
+          } catch (e) {
+            reject(e);
+          }
+        });
+      },
+    );
+    req.on('timeout', () => req.destroy(new Error('worker request timeout')));
+    req.on('error', reject);
+    req.end();
+  });
+}
+
+/**
+ * Ask the resident worker for a refresh without waiting for the crawl: the search answers 503
+ * right away and the next search sees the loaded rows. A worker that is down or replies with
+ * something else is reported, not replaced by a spawn on the request path.
+ */
+async function startWorkerRefresh(): Promise<ParserResult> {
+  let reply: { job?: Partial<WorkerJob>; started?: boolean } | null;
+  try {
+    reply = await workerRequest<{ job?: Partial<WorkerJob>; started?: boolean } | null>('POST', '/refresh');
+  } catch (e) {
+    console.error('[attestation] worker unavailable:', (e as Error).message);
+    return { ok: false, hint: WORKER_DOWN_HINT };
+  }
+  const job = reply?.job;
+  if (!job || typeof job.id !== 'number') {
+    console.error('[attestation] unexpected worker reply:', JSON.stringify(reply).slice(0, 200));
+    return { ok: false, hint: WORKER_DOWN_HINT };
+  }
+  console.log('[attestation] worker refresh job', job.id, reply?.started ? 'started' : 'already running');
+  return { ok: false, started: true };
+}
+
+let parserInFlight: Promise<ParserResult> | null = null;
+
+/**
+ * One refresh at a time per API process: concurrent empty-DB searches wait for the same run.
+ * With ATTESTATION_WORKER_URL the worker does the crawl; without it (deployments that load
+ * by cron) the parser is spawned and awaited as before.
+ */
+function runParserOnce(): Promise<ParserResult> {
+  if (!parserInFlight) {
+    parserInFlight = (WORKER_URL ? startWorkerRefresh() : spawnParser()).finally(() => {
+      parserInFlight = null;
+    });
+  }
+  return parserInFlight;
+}
+
+function spawnParser(): Promise<ParserResult> {
   const scriptPath = path.join(PROJECT_ROOT, 'scripts', 'parser_attestation.py');
   const pythonCommands = ['python3', 'python'];
 
-  function run(cmd: string): Promise<{ ok: boolean; hint?: string }> {
+  function run(cmd: string): Promise<ParserResult> {
     return new Promise((resolve) => {
       let resolved = false;
-      const done = (result: { ok: boolean; hint?: string }) => {
+      const done = (result: ParserResult) => {
         if (resolved) return;
         resolved = true;
         resolve(result);
@@ -51,7 +134,7 @@ function runParserOnce(): Promise<{ ok: boolean; hint?: string }> {
           console.error('[attestation] parser timeout');
           done({
             ok: false,
-            hint: 'Загрузка данных заняла слишком много времени. Запустите на сервере: python3 scripts/parser_attestation.py (или настройте cron в 06:00).',
+            hint: TIMEOUT_HINT,
           });
           return;
         }
@@ -68,7 +151,7 @@ function runParserOnce(): Promise<{ ok: boolean; hint?: string }> {
         }
         done({
           ok: false,
-          hint: 'Загрузка данных заняла слишком много времени. Запустите на сервере: python3 scripts/parser_attestation.py (или настройте cron в 06:00).',
+          hint: TIMEOUT_HINT,
         });
       }, PARSER_TIMEOUT_MS);
 
@@ -121,6 +204,45 @@ async function getDataCoverageMessage(): Promise<string | null> {
   return `ФИО не встречается в данных за следующие даты публикаций: ${dates.join(', ')}.`;
 }
 
+/** exam_date is a DATE column (UTC midnight in Prisma); responses keep the site's dd.mm.yyyy. */
+function formatExamDate(d: Date | null): string | null {
+  if (!d) return null;
+  const iso = d.toISOString();
+  return `${iso.slice(8, 10)}.${iso.slice(5, 7)}.${iso.slice(0, 4)}`;
+}
+
+/** exam_time is a TIME column (1970-01-01THH:MM:SSZ in Prisma) -> HH:MM. */
+function formatExamTime(t: Date | null): string | null {
+  return t ? t.toISOString().slice(11, 16) : null;
+}
+
+const SEARCH_LIMIT = 50;
+
+function findPeople(where: Prisma.AttestationPersonWhereInput, take: number) {
+  return prisma.attestationPerson.findMany({
+    where,
+    // exam_date — DATE: свежие экзамены первыми по календарю.
+    orderBy: [
+      { examDate: { sort: 'desc', nulls: 'last' } },
+      { publishedDate: { sort: 'desc', nulls: 'last' } },
+    ],
+    take,
+    select: {
+      id: true,
+      fullName: true,
+      specialty: true,
+      region: true,
+      stage: true,
+      profession: true,
+      examDate: true,
+      examTime: true,
+      sourceUrl: true,
+      sourceUrls: true,
+      publishedDate: true,
+    },
+  });
+}
+
 router.get('/search', async (req: Request, res: Response) => {
   const raw = typeof req.query.name === 'string' ? req.query.name : '';
   const name = raw.trim();
@@ -133,6 +255,8 @@ router.get('/search', async (req: Request, res: Response) => {
   const normalized = normalizeName(name);
   const searchQuery = firstThreeWords(name);
   const searchPattern = searchQuery.length >= 3 ? searchQuery : normalized;
+  // Кириллица/латиница: prefix по name_key, первые 3 слова — как searchPattern.
+  const keyPattern = nameKey(name).split(' ').slice(0, 3).join(' ');
   console.log('[attestation/search] query:', { name: name.slice(0, 50), searchPattern: searchPattern.slice(0, 50) });
   try {
     const total = await prisma.attestationPerson.count();
@@ -141,6 +265,12 @@ router.get('/search', async (req: Request, res: Response) => {
       console.log('[attestation/search] DB empty, running parser...');
       const result = await runParserOnce();
       if (!result.ok) {
+        if (result.started) {
+          return res.status(503).json({
+            ok: false,
+            error: 'База данных аттестаций обновляется. Повторите поиск через несколько минут.',
+          });
+        }
         console.error('[attestation/search] parser failed, hint:', result.hint);
         const message = result.hint
           ? `База данных аттестаций пуста. ${result.hint}`
@@ -150,27 +280,30 @@ router.get('/search', async (req: Request, res: Response) => {
       console.log('[attestation/search] parser finished, re-querying count');
     }
 
-    const rows = await prisma.attestationPerson.findMany({
-      where: {
-        fullNameNormalized: { contains: searchPattern, mode: 'insensitive' },
-      },
-      orderBy: [
-        { examDate: { sort: 'desc', nulls: 'last' } },
-        { publishedDate: { sort: 'desc', nulls: 'last' } },
-      ],
-      take: 50,
-      select: {
-        fullName: true,
-        specialty: true,
-        region: true,
-        stage: true,
-        profession: true,
-        examDate: true,
-        examTime: true,
-        sourceUrl: true,
-        publishedDate: true,
+    // Сначала ключи, посчитанные парсером (search_keys, name_key): равенство по первым трём словам,
+    // все слова запроса среди name_tokens (GIN), префикс name_key. Подстрока по full_name_normalized
+    // (триграммы) только добирает до SEARCH_LIMIT — недописанное слово, середина ФИО.
+    const tokens = nameTokens(name);
+    const rows = await findPeople(
+      {
+        OR: [
+          { fullNameSearch: searchPattern },
+          ...(tokens.length > 0 ? [{ nameTokens: { hasEvery: tokens } }] : []),
+          ...(keyPattern.length >= 3 ? [{ nameKey: { startsWith: keyPattern } }] : []),
+        ],
       },
-    });
+      SEARCH_LIMIT,
+    );
+    if (rows.length < SEARCH_LIMIT) {
+      const more = await findPeople(
+        {
+          fullNameNormalized: { contains: searchPattern, mode: 'insensitive' },
+          id: { notIn: rows.map((r) => r.id) },
+        },
+        SEARCH_LIMIT - rows.length,
+      );
+      rows.push(...more);
+    }
     console.log('[attestation/search] found rows:', rows.length);
     const list = rows.map((r) => ({
       full_name: r.fullName,
@@ -178,9 +311,10 @@ router.get('/search', async (req: Request, res: Response) => {
       region: r.region,
       stage: r.stage,
       profession: r.profession,
-      exam_date: r.examDate,
-      exam_time: r.examTime,
+      exam_date: formatExamDate(r.examDate),
+      exam_time: formatExamTime(r.examTime),
       source_url: r.sourceUrl,
+      source_urls: r.sourceUrls,
       published_date: r.publishedDate ? r.publishedDate.toISOString().slice(0, 10) : null,
     }));
 
@@ -18,3 +18,33 @@ export function firstThreeWords(name: string): string {
   const words = normalized.split(/\s+/).filter(Boolean);
   return words.slice(0, 3).join(' ').trim();
 }
+
+/** Distinct words in order — column name_tokens (search_keys in parser_attestation.py). */
+export function nameTokens(name: string): string[] {
+  return [...new Set(normalizeName(name).split(' ').filter(Boolean))];
+}
+
+/**
+ * Canonical transliteration key (column name_key), same tables as NAME_KEY_* in parser_attestation.py:
+ * Cyrillic → Latin, apostrophes dropped, х/ҳ/x/kh, қ/q/k, ж/zh/dj, ye/e, -iy/-ii/-i folded to one spelling.
+ */
+const NAME_KEY_CHARS: Record<string, string> = {
+  а: 'a', б: 'b', в: 'v', г: 'g', ғ: 'g', д: 'd', е: 'e', ё: 'yo', ж: 'j',
+  з: 'z', и: 'i', й: 'y', к: 'k', қ: 'k', л: 'l', м: 'm', н: 'n', о: 'o',
+  п: 'p', р: 'r', с: 's', т: 't', у: 'u', ў: 'o', ф: 'f', х: 'h', ҳ: 'h',
+  ц: 'ts', ч: 'ch', ш: 'sh', щ: 'sh', ъ: '', ы: 'i', ь: '', э: 'e', ю: 'yu',
+  я: 'ya', x: 'h', q: 'k',
+  "'": '', '`': '', '‘': '', '’': '', 'ʻ': '', 'ʼ': '', '-': ' ',
+};
+const NAME_KEY_DIGRAPHS: Record<string, string> = { dzh: 'j', kh: 'h', zh: 'j', dj: 'j', ye: 'e', iy: 'i', ii: 'i' };
+
+export function nameKey(name: string): string {
+  let s = '';
+  for (const ch of name.toLowerCase()) {
+    const mapped = NAME_KEY_CHARS[ch];
+    s += mapped === undefined ? ch : mapped;
+  }
+  s = s.replace(/[^a-z0-9\s]+/g, '');
+  s = s.split(/\s+/).filter(Boolean).join(' ');
+  return s.replace(/dzh|kh|zh|dj|ye|iy\b|ii\b/g, (m) => NAME_KEY_DIGRAPHS[m]);
+}
@@ -1,11 +1,13 @@
 import os
+import time
 import uuid
 import sqlite3
 import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from multicard_client import create_payment, verify_callback_sign_payload, get_payment_info
-
 
+import click
 from flask import (
     Blueprint,
     request,
@@ -15,6 +17,17 @@ from flask import (
     current_app,
 )
 
+from multicard_client import (
+    create_payment,
+    verify_callback_sign_payload,
+    get_payment_info,
+    get_payment_info_cached,
+    payment_status,
+    http_stats,
+    MULTICARD_PAID_STATUSES,
+    MULTICARD_CANCELED_STATUSES,
+)
+
 # ==========================================================
 # CONFIG
 # ==========================================================
@@ -27,6 +40,11 @@ GUEST_ACCESS_TTL_MIN = 60
 
 MULTICARD_STORE_ID = int(os.environ["MULTICARD_STORE_ID"])
 
+# сверка зависших инвойсов (flask guest reconcile)
+GUEST_RECONCILE_BATCH = int(os.environ.get("GUEST_RECONCILE_BATCH", "500"))
+GUEST_RECONCILE_CONCURRENCY = int(os.environ.get("GUEST_RECONCILE_CONCURRENCY", "8"))
+GUEST_RECONCILE_RATE = float(os.environ.get("GUEST_RECONCILE_RATE", "10"))  # запросов/сек к Multicard
+
 guest_bp = Blueprint("guest", __name__)
 
 
@@ -222,17 +240,13 @@ def multicard_callback():
         # fallback: проверяем через API по uuid
         if uuid_:
             try:
-                verify_resp = get_payment_info(uuid_)
+                # ретраи Multicard по одному uuid -> один запрос к API (см. get_payment_info_cached)
+                verify_resp = get_payment_info_cached(uuid_)
                 current_app.logger.warning("🔎 Multicard API verify response=%s", verify_resp)
 
-                payload = None
-                if isinstance(verify_resp, dict):
-                    payload = verify_resp.get("data") or verify_resp
+                status, _ = payment_status(verify_resp)
 
-                status = str((payload or {}).get("status") or "").strip().lower()
-
-                # ✅ ВАЖНО: у Multicard часто статус "billing" даже после успешной оплаты
-                if status in ("paid", "success", "completed", "billing"):
+                if status in MULTICARD_PAID_STATUSES:
                     is_paid = True
                 else:
                     current_app.logger.warning("⚠️ Multicard API status is not paid: %s", status)
@@ -316,8 +330,9 @@ def _mark_guest_paid(invoice_id: str, uuid_: str, amount: int):
 def _mark_guest_canceled(invoice_id: str):
     try:
         conn = _db()
+        # только из 'created': не затираем paid, который callback мог поставить параллельно
         conn.execute(
-            "UPDATE guest_access SET status='canceled' WHERE invoice_id=?",
+            "UPDATE guest_access SET status='canceled' WHERE invoice_id=? AND status='created'",
             (invoice_id,),
         )
         conn.commit()
@@ -327,6 +342,133 @@ def _mark_guest_canceled(invoice_id: str):
 
 
 
+# ==========================================================
+# RECONCILE (callback не пришёл -> спрашиваем Multicard сами)
+# ==========================================================
+class _RateLimiter:
+    """
+    Spaces calls at least 1/rate seconds apart across threads (one host: mesh.multicard.uz).
+    """
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            at = max(self._next_at, now)
+            self._next_at = at + self._interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def _payment_lag(payload: dict):
+    """
+    Seconds between Multicard's payment_time and now: how long the user waited for access.
+    """
+    try:
+        paid_at = datetime.strptime(str(payload.get("payment_time")), "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+    return max((datetime.now() - paid_at).total_seconds(), 0.0)
+
+
+def reconcile_guest_payments(
+    limit: int = GUEST_RECONCILE_BATCH,
+    concurrency: int = GUEST_RECONCILE_CONCURRENCY,
+    rate: float = GUEST_RECONCILE_RATE,
+) -> dict:
+    """
+    Polls Multicard for guest invoices still in status 'created' (with a stored mc_uuid) and marks them
+    paid/canceled like the callback would. Newest first: abandoned checkouts stay 'created' forever,
+    and oldest-first they would fill every batch while users waiting at /enter are never reached.
+    Requests go out from a bounded thread pool, rate-limited; rows are updated from the calling
+    thread (needs an app context).
+    """
+    conn = _db()
+    rows = conn.execute(
+        """
+        SELECT invoice_id, mc_uuid FROM guest_access
+        WHERE status='created' AND mc_uuid IS NOT NULL AND mc_uuid != ''
+        ORDER BY rowid DESC
+        LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+    conn.close()
+
+    report = {"scanned": len(rows), "paid": 0, "canceled": 0, "pending": 0, "errors": 0}
+    lags = []
+    started = time.monotonic()
+    limiter = _RateLimiter(rate)
+
+    def fetch(mc_uuid):
+        limiter.wait()
+        return get_payment_info(mc_uuid)
+
+    if rows:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = {pool.submit(fetch, row["mc_uuid"]): row for row in rows}
+            for fut in as_completed(futures):
+                row = futures[fut]
+                try:
+                    status, payload = payment_status(fut.result())
+                except Exception:
+                    report["errors"] += 1
+                    current_app.logger.exception("❌ [GUEST RECONCILE] verify failed invoice=%s", row["invoice_id"])
+                    continue
+
+                if status in MULTICARD_PAID_STATUSES:
+                    try:
+                        amount = int(payload.get("amount") or 0)
+                    except (TypeError, ValueError):
+                        amount = 0
+                    _mark_guest_paid(row["invoice_id"], row["mc_uuid"], amount)
+                    report["paid"] += 1
+                    lag = _payment_lag(payload)
+                    if lag is not None:
+                        lags.append(lag)
+                elif status in MULTICARD_CANCELED_STATUSES:
+                    _mark_guest_canceled(row["invoice_id"])
+                    report["canceled"] += 1
+                else:
+                    report["pending"] += 1
+
+    elapsed = time.monotonic() - started
+    report["elapsed_sec"] = round(elapsed, 2)
+    report["per_sec"] = round(len(rows) / elapsed, 1) if elapsed > 0 else 0.0
+    report["lag_avg_sec"] = round(sum(lags) / len(lags), 1) if lags else None
+    report["lag_max_sec"] = round(max(lags), 1) if lags else None
+    report["http"] = http_stats()  # keep-alive пул этого процесса, накопительно за все проходы
+
+    current_app.logger.info("[GUEST RECONCILE] %s", report)
+    return report
+
+
+@guest_bp.cli.command("reconcile")
+@click.option("--limit", default=GUEST_RECONCILE_BATCH, show_default=True, help="invoices per pass")
+@click.option("--concurrency", default=GUEST_RECONCILE_CONCURRENCY, show_default=True, help="parallel Multicard requests")
+@click.option("--rate", default=GUEST_RECONCILE_RATE, show_default=True, help="Multicard requests per second")
+@click.option("--every", default=0.0, help="repeat every N seconds (0 = one pass)")
+def reconcile_command(limit, concurrency, rate, every):
+    """Mark stuck guest invoices paid/canceled by asking Multicard (flask guest reconcile)."""
+    while True:
+        report = reconcile_guest_payments(limit, concurrency, rate)
+        lag = "-"
+        if report["lag_max_sec"] is not None:
+            lag = f"avg {report['lag_avg_sec']}s max {report['lag_max_sec']}s"
+        click.echo(
+            "scanned={scanned} paid={paid} canceled={canceled} pending={pending} errors={errors} "
+            "{per_sec}/s in {elapsed_sec}s".format(**report)
+            + f" lag={lag} conn_reuse={report['http']['reuse_ratio']}"
+        )
+        if every <= 0:
+            break
+        time.sleep(every)
+
+
 # ==========================================================
 # ENTER (после оплаты)
 # ==========================================================
@@ -0,0 +1,299 @@
+"""
+Asyncio counterpart of multicard_client for code running in an event loop:
+the same calls (get_token, create_payment, get_payment_info, verify_callback_sign_payload)
+on aiohttp, so one process keeps hundreds of checkouts/verifications in flight
+instead of blocking a worker per request.
+
+    async with MulticardAsyncClient() as mc:
+        payment = await mc.create_payment(amount=..., invoice_id=..., ...)
+
+Config, payload format and the shared token file are those of multicard_client:
+sync and async callers (and all gunicorn workers) reuse one Multicard token.
+Needs aiohttp: pip install -r docs/requirements-multicard.txt
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Optional, Dict, Any
+
+import aiohttp
+
+from multicard_client import (
+    AUTH_URL,
+    PAYMENT_URL,
+    MULTICARD_BASE_URL,
+    MULTICARD_APPLICATION_ID,
+    MULTICARD_SECRET,
+    MULTICARD_CONNECT_TIMEOUT,
+    MULTICARD_READ_TIMEOUT,
+    MULTICARD_TOKEN_REFRESH_MARGIN,
+    MULTICARD_STATS_LOG_INTERVAL,
+    _parse_expired_at,
+    _token_usable,
+    _read_shared_token,
+    _write_shared_token,
+    _shared_refresh_lock,
+    _payment_payload,
+    _payment_result,
+    verify_callback_sign_payload,
+)
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# ENV CONFIG
+# =====================================================
+# соединений в пуле (keep-alive) и одновременных запросов к Multicard на один клиент
+MULTICARD_ASYNC_POOL_SIZE = int(os.environ.get("MULTICARD_ASYNC_POOL_SIZE", "100"))
+MULTICARD_ASYNC_CONCURRENCY = int(os.environ.get("MULTICARD_ASYNC_CONCURRENCY", "200"))
+
+__all__ = ["MulticardAsyncClient", "verify_callback_sign_payload"]
+
+
+class MulticardAsyncClient:
+    """
+    One aiohttp session (connection pool) plus a semaphore capping in-flight requests;
+    create one per event loop and share it between tasks.
+    Token refresh is single-flight: concurrent callers await the same task, and inside
+    MULTICARD_TOKEN_REFRESH_MARGIN the current token is served while a task refreshes it.
+    """
+
+    def __init__(
+        self,
+        *,
+        pool_size: int = MULTICARD_ASYNC_POOL_SIZE,
+        concurrency: int = MULTICARD_ASYNC_CONCURRENCY,
+    ):
+        self.pool_size = pool_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._stats = {
+            "requests": 0,
+            "new_connections": 0,
+        }
+        self._stats_logged_at = time.monotonic()
+
+    async def __aenter__(self) -> "MulticardAsyncClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        if self._session is not None:
+            if self._stats["requests"]:
+                logger.info("[Multicard] async http pool %s", self.http_stats())
+            await self._session.close()
+            self._session = None
+
+    # =====================================================
+    # HTTP SESSION
+    # =====================================================
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            trace = aiohttp.TraceConfig()
+            trace.on_request_start.append(self._on_request_start)
+            trace.on_connection_create_end.append(self._on_connection_create)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=MULTICARD_CONNECT_TIMEOUT,
+                    sock_read=MULTICARD_READ_TIMEOUT,
+                ),
+                trace_configs=[trace],
+            )
+        return self._session
+
+    async def _on_request_start(self, session, ctx, params) -> None:
+        self._stats["requests"] += 1
+
+    async def _on_connection_create(self, session, ctx, params) -> None:
+        self._stats["new_connections"] += 1
+
+    def http_stats(self) -> Dict[str, Any]:
+        """
+        Same shape as multicard_client.http_stats(), for this client's pool.
+        """
+        requests_sent = self._stats["requests"]
+        reused = max(requests_sent - self._stats["new_connections"], 0)
+        return {
+            "pool_size": self.pool_size,
+            "requests": requests_sent,
+            "new_connections": self._stats["new_connections"],
+            "reused": reused,
+            "reuse_ratio": round(reused / requests_sent, 3) if requests_sent else 0.0,
+        }
+
+    def _log_stats(self) -> None:
+        """
+        http_stats() to the log once per MULTICARD_STATS_LOG_INTERVAL (and on close).
+        """
+        now = time.monotonic()
+        if MULTICARD_STATS_LOG_INTERVAL > 0 and now - self._stats_logged_at >= MULTICARD_STATS_LOG_INTERVAL:
+            self._stats_logged_at = now
+            logger.info("[Multicard] async http pool %s", self.http_stats())
+
+    async def _send(self, method: str, url: str, headers: Dict[str, str], **kwargs) -> aiohttp.ClientResponse:
+        """
+        Authorized request; on 401 refreshes the token (shared with concurrent 401s) and retries once.
+        The body is read before returning, so the connection is already back in the pool.
+        """
+        self._log_stats()
+        token = await self.get_token()
+        for attempt in range(2):
+            headers["Authorization"] = f"Bearer {token}"
+            async with self._semaphore:
+                async with self.session.request(method, url, headers=headers, **kwargs) as resp:
+                    await resp.read()
+            if resp.status != 401 or attempt:
+                return resp
+            logger.warning("[Multicard] 401 on %s %s, refreshing token and retrying once", method, url)
+            token = await self.get_token(force=True, rejected=token)
+        return resp
+
+    # =====================================================
+    # AUTH
+    # =====================================================
+    async def _request_token(self) -> Dict[str, Any]:
+        async with self._semaphore:
+            async with self.session.post(
+                AUTH_URL,
+                json={
+                    "application_id": MULTICARD_APPLICATION_ID,
+                    "secret": MULTICARD_SECRET,
+                },
+            ) as resp:
+                if resp.status >= 400:
+                    logger.error("[Multicard] auth failed %s %s", resp.status, await resp.text())
+                    resp.raise_for_status()
+                data = await resp.json(content_type=None)
+
+        token = data.get("access_token") or data.get("token")
+        expires_at = _parse_expired_at(data.get("expired_at"))
+
+        if not token:
+            raise RuntimeError(f"Invalid auth response: {data}")
+
+        return {"token": token, "expires_at": expires_at or (time.time() + 600)}
+
+    async def _do_refresh(self, rejected: Optional[str] = None, proactive: bool = False) -> str:
+        margin = MULTICARD_TOKEN_REFRESH_MARGIN if proactive else 0
+        now = time.time() + margin
+        if _token_usable(self._token, self._expires_at, now, rejected):
+            return self._token
+
+        # flock ждёт другой процесс, пока тот ходит в /auth: ждём в потоке, не в event loop
+        lock = _shared_refresh_lock()
+        acquire = asyncio.ensure_future(asyncio.to_thread(lock.__enter__))
+        try:
+            # shield: при отмене поток всё равно дождётся flock, и снять его нужно после этого
+            await asyncio.shield(acquire)
+            # файл токена — блокирующий ввод-вывод (open, mkstemp, rename): тоже в потоке
+            shared = await asyncio.to_thread(_read_shared_token)
+            if shared and _token_usable(shared["token"], shared["expires_at"], now, rejected):
+                fresh = shared
+            else:
+                fresh = await self._request_token()
+                await asyncio.to_thread(_write_shared_token, fresh["token"], fresh["expires_at"])
+                logger.info("[Multicard] token refreshed, exp=%s", fresh["expires_at"])
+        finally:
+            if acquire.done():
+                lock.__exit__()
+            else:
+                acquire.add_done_callback(lambda _: lock.__exit__())
+
+        self._token = fresh["token"]
+        self._expires_at = fresh["expires_at"]
+        return self._token
+
+    def _start_refresh(self, rejected: Optional[str] = None, proactive: bool = False) -> asyncio.Task:
+        task = asyncio.create_task(self._do_refresh(rejected, proactive))
+        task.add_done_callback(self._refresh_done)
+        self._refresh_task = task
+        return task
+
+    @staticmethod
+    def _refresh_done(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            # текущий токен (если есть) ещё жив: следующий вызов get_token попробует снова
+            logger.error("[Multicard] token refresh failed", exc_info=task.exception())
+
+    async def _refresh(self, rejected: Optional[str] = None) -> str:
+        task = self._refresh_task
+        if task is not None and not task.done():
+            token = await asyncio.shield(task)
+            if token != rejected:
+                return token
+        task = self._refresh_task
+        if task is None or task.done():
+            task = self._start_refresh(rejected)
+        return await asyncio.shield(task)
+
+    async def get_token(self, force: bool = False, rejected: Optional[str] = None) -> str:
+        """
+        Current bearer token; see multicard_client.get_token for force/rejected.
+        """
+        if force:
+            return await self._refresh(rejected=rejected or self._token)
+
+        now = time.time()
+        if _token_usable(self._token, self._expires_at, now):
+            if self._expires_at - MULTICARD_TOKEN_REFRESH_MARGIN <= now and (
+                self._refresh_task is None or self._refresh_task.done()
+            ):
+                self._start_refresh(proactive=True)
+            return self._token
+
+        return await self._refresh()
+
+    # =====================================================
+    # PAYMENT
+    # =====================================================
+    async def create_payment(
+        self,
+        *,
+        amount: int,                 # ❗ ТИЙИНЫ
+        invoice_id: str,
+        payment_system: str,
+        return_url: str,
+        callback_url: str,
+        lang: str = "ru",
+        billing_id: str | None = None,
+    ) -> Dict[str, Any]:
+        payload = _payment_payload(
+            amount=amount,
+            invoice_id=invoice_id,
+            payment_system=payment_system,
+            return_url=return_url,
+            callback_url=callback_url,
+            lang=lang,
+            billing_id=billing_id,
+        )
+
+        logger.info("[Multicard] create_payment payload=%s", payload)
+
+        resp = await self._send("POST", PAYMENT_URL, {"Content-Type": "application/json"}, json=payload)
+
+        if resp.status >= 400:
+            raise RuntimeError(f"Multicard error {resp.status}: {await resp.text()}")
+
+        return _payment_result(await resp.json(content_type=None))
+
+    async def get_payment_info(self, payment_uuid: str) -> dict:
+        """
+        Статус платежа по uuid (как multicard_client.get_payment_info).
+        """
+        if not payment_uuid:
+            raise ValueError("payment_uuid is empty")
+
+        url = f"{MULTICARD_BASE_URL}/payment/{payment_uuid}"
+        resp = await self._send("GET", url, {"Accept": "application/json"})
+        resp.raise_for_status()
+        return await resp.json(content_type=None)
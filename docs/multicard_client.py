@@ -2,10 +2,18 @@ import os
 import time
 import hashlib
 import logging
+import threading
+import json
+import fcntl
+import stat
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import Future
 from datetime import datetime
 from typing import Optional, Dict, Any
 
 import requests
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
@@ -17,19 +25,151 @@ MULTICARD_APPLICATION_ID = os.environ.get("MULTICARD_APPLICATION_ID", "").strip(
 MULTICARD_SECRET = os.environ.get("MULTICARD_SECRET", "").strip()
 MULTICARD_STORE_ID = int(os.environ.get("MULTICARD_STORE_ID", "0"))
 
+# keep-alive пул соединений к Multicard (на процесс)
+MULTICARD_POOL_SIZE = int(os.environ.get("MULTICARD_POOL_SIZE", "10"))
+MULTICARD_CONNECT_TIMEOUT = float(os.environ.get("MULTICARD_CONNECT_TIMEOUT", "5"))
+MULTICARD_READ_TIMEOUT = float(os.environ.get("MULTICARD_READ_TIMEOUT", "20"))
+# раз в столько секунд статистика пула пишется в лог (каждым процессом); 0 — не писать
+MULTICARD_STATS_LOG_INTERVAL = float(os.environ.get("MULTICARD_STATS_LOG_INTERVAL", "300"))
+
+# токен обновляется в фоне за столько секунд до expired_at
+MULTICARD_TOKEN_REFRESH_MARGIN = float(os.environ.get("MULTICARD_TOKEN_REFRESH_MARGIN", "300"))
+# файл с токеном, общий для воркеров gunicorn; по умолчанию выключен (токен только в процессе).
+# Каталог файла должен быть приватным (владелец — пользователь приложения, 0700), например
+# /var/lib/<app>/multicard/token.json; иначе файл не используется.
+MULTICARD_TOKEN_FILE = os.environ.get("MULTICARD_TOKEN_FILE", "").strip()
+TOKEN_EXPIRY_SKEW = 15  # не используем токен, которому осталось меньше 15 секунд
+
+# кэш статусов платежей для проверки callback'ов (на процесс): финальные статусы живут дольше
+MULTICARD_VERIFY_CACHE_SIZE = int(os.environ.get("MULTICARD_VERIFY_CACHE_SIZE", "2048"))
+MULTICARD_VERIFY_CACHE_TTL = float(os.environ.get("MULTICARD_VERIFY_CACHE_TTL", "600"))
+MULTICARD_VERIFY_PENDING_TTL = float(os.environ.get("MULTICARD_VERIFY_PENDING_TTL", "5"))
+
+# ✅ у Multicard часто статус "billing" даже после успешной оплаты
+MULTICARD_PAID_STATUSES = ("paid", "success", "completed", "billing")
+MULTICARD_CANCELED_STATUSES = ("canceled", "cancelled", "revert", "reverted", "error", "failed")
+
 AUTH_URL = f"{MULTICARD_BASE_URL}/auth"
 PAYMENT_URL = f"{MULTICARD_BASE_URL}/payment"
 
+# requests принимает (connect, read): быстрый отказ на TCP/TLS, но терпеливое чтение ответа
+HTTP_TIMEOUT = (MULTICARD_CONNECT_TIMEOUT, MULTICARD_READ_TIMEOUT)
+
 if not MULTICARD_APPLICATION_ID or not MULTICARD_SECRET or not MULTICARD_STORE_ID:
     raise RuntimeError("MULTICARD env vars are not set correctly")
 
+# =====================================================
+# HTTP SESSION (keep-alive pool)
+# =====================================================
+# One HTTPAdapter (urllib3 pool) per process, shared by all threads; each thread gets its own
+# requests.Session mounted on it, since Session itself is not documented as thread-safe.
+# The adapter is rebuilt after fork so gunicorn workers never share sockets with the master.
+_http_lock = threading.Lock()
+_http_local = threading.local()
+_http_state = {
+    "pid": None,
+    "adapter": None,
+    "generation": 0,
+}
+_stats_lock = threading.Lock()
+_stats_state = {
+    "logged_at": time.monotonic(),
+}
+
+
+def _get_adapter() -> HTTPAdapter:
+    pid = os.getpid()
+    if _http_state["pid"] != pid:
+        with _http_lock:
+            if _http_state["pid"] != pid:
+                _http_state["adapter"] = HTTPAdapter(
+                    pool_connections=1,  # один хост: mesh.multicard.uz
+                    pool_maxsize=MULTICARD_POOL_SIZE,
+                )
+                _http_state["generation"] += 1
+                _http_state["pid"] = pid
+    return _http_state["adapter"]
+
+
+def get_session() -> requests.Session:
+    """
+    Session for the current thread, backed by the shared keep-alive pool.
+    """
+    log_stats()
+    adapter = _get_adapter()
+    sess = getattr(_http_local, "session", None)
+    if sess is None or _http_local.generation != _http_state["generation"]:
+        sess = requests.Session()
+        sess.mount("https://", adapter)
+        sess.mount("http://", adapter)
+        _http_local.session = sess
+        _http_local.generation = _http_state["generation"]
+    return sess
+
+
+def http_stats() -> Dict[str, Any]:
+    """
+    Connection reuse of this process's pool: requests sent vs. new TCP/TLS connections opened.
+    reuse_ratio close to 1.0 means the handshakes are gone.
+    """
+    adapter = _http_state["adapter"]
+    requests_sent = 0
+    connections = 0
+    if adapter is not None and _http_state["pid"] == os.getpid():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            try:
+                pool = pools[key]
+            except KeyError:
+                continue
+            requests_sent += pool.num_requests
+            connections += pool.num_connections
+
+    reused = max(requests_sent - connections, 0)
+    return {
+        "pool_size": MULTICARD_POOL_SIZE,
+        "requests": requests_sent,
+        "new_connections": connections,
+        "reused": reused,
+        "reuse_ratio": round(reused / requests_sent, 3) if requests_sent else 0.0,
+    }
+
+
+def log_stats(force: bool = False) -> None:
+    """
+    Log http_stats() and, once the callback cache has been used, payment_info_cache_stats()
+    at most once per MULTICARD_STATS_LOG_INTERVAL (force: right now). Called on the request
+    path, so every gunicorn worker reports its own pool without a background thread.
+    """
+    now = time.monotonic()
+    if not force:
+        if MULTICARD_STATS_LOG_INTERVAL <= 0 or now - _stats_state["logged_at"] < MULTICARD_STATS_LOG_INTERVAL:
+            return
+        with _stats_lock:
+            if now - _stats_state["logged_at"] < MULTICARD_STATS_LOG_INTERVAL:
+                return
+            _stats_state["logged_at"] = now
+    logger.info("[Multicard] http pool pid=%s %s", os.getpid(), http_stats())
+    cache_stats = payment_info_cache_stats()
+    if cache_stats["hits"] + cache_stats["misses"] + cache_stats["coalesced"]:
+        logger.info("[Multicard] payment info cache pid=%s %s", os.getpid(), cache_stats)
+
 # =====================================================
 # AUTH CACHE
 # =====================================================
+# Token lifecycle:
+# - hot path: a token with more than MULTICARD_TOKEN_REFRESH_MARGIN left is returned without locks;
+# - inside the margin the current (still valid) token is returned and one background thread refreshes it;
+# - only without a usable token does the caller wait, and then for a single in-flight /auth:
+#   threads queue on _auth_lock and, with MULTICARD_TOKEN_FILE set, processes on
+#   flock(MULTICARD_TOKEN_FILE + ".lock"); whoever comes second picks up the token the first one wrote.
 _auth_cache = {
     "token": None,
     "expires_at": 0.0,
+    "refreshing": False,
 }
+_auth_lock = threading.Lock()
+_schedule_lock = threading.Lock()  # отдельный от _auth_lock: планирование не ждёт идущий /auth
 
 def _parse_expired_at(value: Optional[str]) -> float:
     """
@@ -41,24 +181,112 @@ def _parse_expired_at(value: Optional[str]) -> float:
         return 0.0
 
 
-def get_token(force: bool = False) -> str:
-    now = time.time()
+def _token_usable(token: Optional[str], expires_at: float, now: float, rejected: Optional[str] = None) -> bool:
+    return bool(token) and token != rejected and (expires_at - TOKEN_EXPIRY_SKEW) > now
+
+
+def _private_token_dir() -> Optional[str]:
+    """
+    Directory of MULTICARD_TOKEN_FILE if the token may be shared through it: a real directory
+    owned by this user without group/other access (created 0700 if missing). None -> in-process only.
+    """
+    if not MULTICARD_TOKEN_FILE:
+        return None
+    path = os.path.dirname(os.path.abspath(MULTICARD_TOKEN_FILE))
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError:
+        logger.warning("[Multicard] token dir %s unavailable, token kept in-process", path, exc_info=True)
+        return None
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.geteuid() or st.st_mode & 0o077:
+        logger.warning("[Multicard] token dir %s is not private (owner/0700), token kept in-process", path)
+        return None
+    return path
+
+
+def _open_private(path: str, flags: int) -> int:
+    """
+    os.open without following symlinks; refuses files not owned by us or readable by others.
+    """
+    fd = os.open(path, flags | os.O_NOFOLLOW, 0o600)
+    st = os.fstat(fd)
+    if not stat.S_ISREG(st.st_mode) or st.st_uid != os.geteuid() or st.st_mode & 0o077:
+        os.close(fd)
+        raise PermissionError(f"{path}: not a private file of this user")
+    return fd
+
+
+def _read_shared_token() -> Optional[Dict[str, Any]]:
+    if _private_token_dir() is None:
+        return None
+    try:
+        fd = _open_private(MULTICARD_TOKEN_FILE, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    except OSError:
+        logger.warning("[Multicard] ignoring token file %s", MULTICARD_TOKEN_FILE, exc_info=True)
+        return None
+    try:
+        with os.fdopen(fd, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return {"token": data["token"], "expires_at": float(data["expires_at"])}
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _write_shared_token(token: str, expires_at: float) -> None:
+    directory = _private_token_dir()
+    if directory is None:
+        return
+    tmp = None
+    try:
+        # mkstemp: O_EXCL и 0600 — токен = доступ к магазину
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".multicard_token.", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"token": token, "expires_at": expires_at}, f)
+        os.replace(tmp, MULTICARD_TOKEN_FILE)
+    except OSError:
+        logger.warning("[Multicard] cannot write token file %s", MULTICARD_TOKEN_FILE, exc_info=True)
+        if tmp:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+
+class _shared_refresh_lock:
+    """
+    Cross-process lock (flock) around /auth, so gunicorn workers don't refresh in parallel.
+    """
 
-    # cached token still valid
-    if (
-        not force
-        and _auth_cache["token"]
-        and (_auth_cache["expires_at"] - 15) > now
-    ):
-        return _auth_cache["token"]
+    def __init__(self):
+        self._fd = None
 
-    resp = requests.post(
+    def __enter__(self):
+        if _private_token_dir() is not None:
+            try:
+                self._fd = _open_private(MULTICARD_TOKEN_FILE + ".lock", os.O_RDWR | os.O_CREAT)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except OSError:
+                logger.warning("[Multicard] token file lock unavailable, refreshing without it", exc_info=True)
+                self.__exit__()
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            os.close(self._fd)  # закрытие снимает flock
+            self._fd = None
+
+
+def _request_token() -> Dict[str, Any]:
+    resp = get_session().post(
         AUTH_URL,
         json={
             "application_id": MULTICARD_APPLICATION_ID,
             "secret": MULTICARD_SECRET,
         },
-        timeout=15,
+        timeout=HTTP_TIMEOUT,
     )
 
     if not resp.ok:
@@ -72,19 +300,78 @@ def get_token(force: bool = False) -> str:
     if not token:
         raise RuntimeError(f"Invalid auth response: {data}")
 
-    _auth_cache["token"] = token
-    _auth_cache["expires_at"] = expires_at or (now + 600)
+    return {"token": token, "expires_at": expires_at or (time.time() + 600)}
+
 
-    logger.info("[Multicard] token refreshed, exp=%s", _auth_cache["expires_at"])
-    return token
+def _refresh_token(rejected: Optional[str] = None, proactive: bool = False) -> str:
+    """
+    Single-flight refresh. A token that another thread/worker obtained meanwhile is reused, unless it is
+    the one the caller saw rejected (401). A proactive refresh also skips tokens inside the margin.
+    """
+    with _auth_lock:
+        margin = MULTICARD_TOKEN_REFRESH_MARGIN if proactive else 0
+        now = time.time() + margin
+        if _token_usable(_auth_cache["token"], _auth_cache["expires_at"], now, rejected):
+            return _auth_cache["token"]
+
+        with _shared_refresh_lock():
+            shared = _read_shared_token()
+            if shared and _token_usable(shared["token"], shared["expires_at"], now, rejected):
+                fresh = shared
+            else:
+                fresh = _request_token()
+                _write_shared_token(fresh["token"], fresh["expires_at"])
+                logger.info("[Multicard] token refreshed, exp=%s", fresh["expires_at"])
+
+        _auth_cache["token"] = fresh["token"]
+        _auth_cache["expires_at"] = fresh["expires_at"]
+        return fresh["token"]
+
+
+def _background_refresh() -> None:
+    try:
+        _refresh_token(proactive=True)
+    except Exception:
+        # текущий токен ещё жив: следующий вызов get_token попробует снова
+        logger.exception("[Multicard] background token refresh failed")
+    finally:
+        _auth_cache["refreshing"] = False
+
+
+def _schedule_refresh() -> None:
+    with _schedule_lock:
+        if _auth_cache["refreshing"]:
+            return
+        _auth_cache["refreshing"] = True
+    threading.Thread(target=_background_refresh, name="multicard-token-refresh", daemon=True).start()
+
+
+def get_token(force: bool = False, rejected: Optional[str] = None) -> str:
+    """
+    Current bearer token. force=True (after a 401) refreshes, passing the rejected token lets
+    concurrent 401s share one refresh: if the cache already holds a different token, it is returned.
+    """
+    now = time.time()
+    token = _auth_cache["token"]
+    expires_at = _auth_cache["expires_at"]
+
+    if force:
+        return _refresh_token(rejected=rejected or token)
+
+    if _token_usable(token, expires_at, now):
+        if expires_at - MULTICARD_TOKEN_REFRESH_MARGIN <= now:
+            _schedule_refresh()
+        return token
+
+    return _refresh_token()
 
 
 # =====================================================
 # PAYMENT
 # =====================================================
-def create_payment(
+def _payment_payload(
     *,
-    amount: int,                 # ❗ ТИЙИНЫ
+    amount: int,
     invoice_id: str,
     payment_system: str,
     return_url: str,
@@ -92,13 +379,6 @@ def create_payment(
     lang: str = "ru",
     billing_id: str | None = None,
 ) -> Dict[str, Any]:
-    token = get_token()
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}",
-    }
-
     payload: Dict[str, Any] = {
         "store_id": MULTICARD_STORE_ID,
         "amount": int(amount),
@@ -115,22 +395,10 @@ def create_payment(
     if billing_id:
         payload["billing_id"] = str(billing_id)
 
-    logger.info("[Multicard] create_payment payload=%s", payload)
-
-    r = requests.post(PAYMENT_URL, json=payload, headers=headers, timeout=20)
-
-    # if token expired mid-flight -> retry once
-    if r.status_code == 401:
-        logger.warning("[Multicard] 401 on create_payment, refreshing token and retrying once")
-        token = get_token(force=True)
-        headers["Authorization"] = f"Bearer {token}"
-        r = requests.post(PAYMENT_URL, json=payload, headers=headers, timeout=20)
-
-    if not r.ok:
-        raise RuntimeError(f"Multicard error {r.status_code}: {r.text}")
+    return payload
 
-    data = r.json()
 
+def _payment_result(data: Any) -> Dict[str, Any]:
     # Some APIs return {success:true,data:{...}}
     # If they return straight object - we keep it too.
     if isinstance(data, dict) and data.get("success") is False:
@@ -142,6 +410,50 @@ def create_payment(
 
     return data
 
+
+def create_payment(
+    *,
+    amount: int,                 # ❗ ТИЙИНЫ
+    invoice_id: str,
+    payment_system: str,
+    return_url: str,
+    callback_url: str,
+    lang: str = "ru",
+    billing_id: str | None = None,
+) -> Dict[str, Any]:
+    token = get_token()
+
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {token}",
+    }
+
+    payload = _payment_payload(
+        amount=amount,
+        invoice_id=invoice_id,
+        payment_system=payment_system,
+        return_url=return_url,
+        callback_url=callback_url,
+        lang=lang,
+        billing_id=billing_id,
+    )
+
+    logger.info("[Multicard] create_payment payload=%s", payload)
+
+    r = get_session().post(PAYMENT_URL, json=payload, headers=headers, timeout=HTTP_TIMEOUT)
+
+    # if token expired mid-flight -> retry once
+    if r.status_code == 401:
+        logger.warning("[Multicard] 401 on create_payment, refreshing token and retrying once")
+        token = get_token(force=True, rejected=token)
+        headers["Authorization"] = f"Bearer {token}"
+        r = get_session().post(PAYMENT_URL, json=payload, headers=headers, timeout=HTTP_TIMEOUT)
+
+    if not r.ok:
+        raise RuntimeError(f"Multicard error {r.status_code}: {r.text}")
+
+    return _payment_result(r.json())
+
 def get_payment_info(payment_uuid: str) -> dict:
     """
     Запрашивает статус платежа по uuid через Multicard API.
@@ -160,18 +472,113 @@ def get_payment_info(payment_uuid: str) -> dict:
         "Accept": "application/json",
     }
 
-    resp = requests.get(url, headers=headers, timeout=20)
+    resp = get_session().get(url, headers=headers, timeout=HTTP_TIMEOUT)
 
     # если токен умер -> обновим и повторим 1 раз
     if resp.status_code == 401:
-        token = get_token(force=True)
+        token = get_token(force=True, rejected=token)
         headers["Authorization"] = f"Bearer {token}"
-        resp = requests.get(url, headers=headers, timeout=20)
+        resp = get_session().get(url, headers=headers, timeout=HTTP_TIMEOUT)
 
     resp.raise_for_status()
     return resp.json()
 
 
+def payment_status(info: Any) -> tuple:
+    """
+    (status, payload) from a get_payment_info response; status is lowercased, "" if absent.
+    """
+    payload = None
+    if isinstance(info, dict):
+        payload = info.get("data") or info
+    payload = payload or {}
+    status = str(payload.get("status") or "").strip().lower()
+    return status, payload
+
+
+# =====================================================
+# PAYMENT INFO CACHE (webhook verification)
+# =====================================================
+# Multicard retries callbacks, and every retry with a bad sign used to hit /payment/{uuid} again.
+# get_payment_info_cached keeps an LRU of responses keyed by uuid (paid/canceled for
+# MULTICARD_VERIFY_CACHE_TTL, anything else for MULTICARD_VERIFY_PENDING_TTL so a payment
+# in progress is re-checked soon) and lets concurrent lookups of one uuid share a single request.
+_verify_lock = threading.Lock()
+_verify_cache: "OrderedDict[str, tuple]" = OrderedDict()  # uuid -> (expires_at monotonic, response)
+_verify_inflight: Dict[str, Future] = {}
+_verify_stats = {
+    "hits": 0,
+    "misses": 0,
+    "coalesced": 0,
+    "evictions": 0,
+}
+
+
+def get_payment_info_cached(payment_uuid: str) -> dict:
+    """
+    get_payment_info through the cache. The returned dict is shared between callers: don't mutate it.
+    Errors are not cached; every caller waiting on the failed request gets the exception.
+    """
+    if not payment_uuid:
+        raise ValueError("payment_uuid is empty")
+
+    # попадания в кэш не доходят до get_session(): статистику пишем и отсюда
+    log_stats()
+    with _verify_lock:
+        entry = _verify_cache.get(payment_uuid)
+        if entry is not None and entry[0] > time.monotonic():
+            _verify_cache.move_to_end(payment_uuid)
+            _verify_stats["hits"] += 1
+            return entry[1]
+
+        pending = _verify_inflight.get(payment_uuid)
+        if pending is not None:
+            _verify_stats["coalesced"] += 1
+        else:
+            _verify_stats["misses"] += 1
+            fut = _verify_inflight[payment_uuid] = Future()
+
+    if pending is not None:
+        return pending.result()
+
+    try:
+        info = get_payment_info(payment_uuid)
+    except BaseException as e:
+        with _verify_lock:
+            _verify_inflight.pop(payment_uuid, None)
+        fut.set_exception(e)
+        raise
+
+    status, _ = payment_status(info)
+    final = status in MULTICARD_PAID_STATUSES or status in MULTICARD_CANCELED_STATUSES
+    ttl = MULTICARD_VERIFY_CACHE_TTL if final else MULTICARD_VERIFY_PENDING_TTL
+
+    with _verify_lock:
+        _verify_inflight.pop(payment_uuid, None)
+        if ttl > 0 and MULTICARD_VERIFY_CACHE_SIZE > 0:
+            _verify_cache[payment_uuid] = (time.monotonic() + ttl, info)
+            _verify_cache.move_to_end(payment_uuid)
+            while len(_verify_cache) > MULTICARD_VERIFY_CACHE_SIZE:
+                _verify_cache.popitem(last=False)
+                _verify_stats["evictions"] += 1
+
+    fut.set_result(info)
+    return info
+
+
+def payment_info_cache_stats() -> Dict[str, Any]:
+    """
+    Hit/miss counters of get_payment_info_cached for this process; hit_ratio counts coalesced as hits.
+    """
+    with _verify_lock:
+        stats = dict(_verify_stats)
+        stats["size"] = len(_verify_cache)
+        stats["inflight"] = len(_verify_inflight)
+    lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+    stats["hit_ratio"] = round((stats["hits"] + stats["coalesced"]) / lookups, 3) if lookups else 0.0
+    return stats
+
+
 # =====================================================
 # CALLBACK SIGN VERIFY (FIXED)
 # =====================================================
@@ -18,6 +18,7 @@ module.exports = {
       max_memory_restart: '500M',
       env: {
         NODE_ENV: 'production',
+        ATTESTATION_WORKER_URL: 'http://127.0.0.1:8765',
       },
       env_file: path.join(root, 'apps/api/.env'),
     },
@@ -50,5 +51,19 @@ module.exports = {
       },
       env_file: path.join(root, 'apps/api/.env'),
     },
+    {
+      // Resident attestation parser: exam-api triggers refreshes via ATTESTATION_WORKER_URL
+      name: 'attestation-worker',
+      cwd: root,
+      script: 'scripts/parser_attestation.py',
+      interpreter: 'python3',
+      args: '--serve 127.0.0.1:8765',
+      exec_mode: 'fork',
+      instances: 1,
+      autorestart: true,
+      watch: false,
+      max_memory_restart: '500M',
+      env_file: path.join(root, 'apps/api/.env'),
+    },
   ],
 };
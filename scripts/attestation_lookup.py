@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+In-process name lookup over the snapshot written by parser_attestation.py --snapshot.
+The file is memory-mapped: opening it reads only the header, queries touch the pages they
+need, and every process that maps the same file shares them. Three searches, all on name_key
+(so Cyrillic/Latin spellings match, see name_key in parser_attestation.py):
+prefix (binary search over the sorted keys), contains (substring, filtered through the
+trigram posting lists) and similar (pg_trgm-style similarity).
+
+    with AttestationSnapshot("/var/lib/attestation/people.snap") as snap:
+        snap.prefix("Қодиров Ҳасан")
+"""
+
+import sys
+import json
+import mmap
+import bisect
+import argparse
+from collections import Counter
+
+from parser_attestation import (
+    SNAPSHOT_FIELDS,
+    SNAPSHOT_HEADER,
+    SNAPSHOT_MAGIC,
+    name_key,
+    name_trigrams,
+    trigram_code,
+)
+
+DEFAULT_LIMIT = 50
+SIMILARITY_THRESHOLD = 0.3  # как pg_trgm.similarity_threshold по умолчанию
+
+
+class _SortedKeys:
+    """Sequence view of the snapshot's distinct keys (bytes) for bisect."""
+
+    def __init__(self, snapshot: "AttestationSnapshot"):
+        self._snapshot = snapshot
+
+    def __len__(self) -> int:
+        return self._snapshot.keys
+
+    def __getitem__(self, key_no: int) -> bytes:
+        return self._snapshot.key_bytes(key_no)
+
+
+class AttestationSnapshot:
+    """Read-only mmap view of one snapshot file; safe to share between threads."""
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise ValueError("attestation snapshots are little-endian")
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, rows, self.keys, trigrams, keys_size, rows_size, self.created = SNAPSHOT_HEADER.unpack_from(self._mm, 0)
+        if magic != SNAPSHOT_MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path}: not an attestation snapshot")
+        self._view = memoryview(self._mm)
+        self._sections = []
+        pos = SNAPSHOT_HEADER.size
+
+        def uint32s(count: int) -> memoryview:
+            nonlocal pos
+            section = self._view[pos:pos + 4 * count].cast("I")
+            self._sections.append(section)
+            pos += 4 * count
+            return section
+
+        self._key_offsets = uint32s(self.keys + 1)
+        self._key_rows = uint32s(self.keys + 1)
+        self._row_offsets = uint32s(rows + 1)
+        self._trigrams = uint32s(trigrams)
+        self._posting_offsets = uint32s(trigrams + 1)
+        self._postings = uint32s(self._posting_offsets[trigrams])
+        self._keys_at = pos
+        self._rows_at = pos + keys_size
+        if self._rows_at + rows_size != len(self._mm):
+            self.close()
+            raise ValueError(f"{path}: truncated snapshot")
+        self._sorted_keys = _SortedKeys(self)
+
+    def __len__(self) -> int:
+        return len(self._row_offsets) - 1
+
+    def __enter__(self) -> "AttestationSnapshot":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        # Срезы memoryview держат буфер mmap: их нужно освободить до mm.close().
+        for section in self._sections:
+            section.release()
+        self._view.release()
+        self._mm.close()
+
+    def key_bytes(self, key_no: int) -> bytes:
+        offsets = self._key_offsets
+        return self._mm[self._keys_at + offsets[key_no]:self._keys_at + offsets[key_no + 1]]
+
+    def row(self, row_no: int, key: str) -> dict:
+        offsets = self._row_offsets
+        payload = self._mm[self._rows_at + offsets[row_no]:self._rows_at + offsets[row_no + 1]]
+        row = dict(zip(SNAPSHOT_FIELDS, json.loads(payload)))
+        row["name_key"] = key
+        return row
+
+    def rows(self, key_no: int) -> list[dict]:
+        """All rows of one distinct key (newest publication first)."""
+        key = self.key_bytes(key_no).decode("ascii")
+        return [self.row(r, key) for r in range(self._key_rows[key_no], self._key_rows[key_no + 1])]
+
+    def _collect(self, key_nos, limit: int) -> list[dict]:
+        out = []
+        for key_no in key_nos:
+            out.extend(self.rows(key_no))
+            if len(out) >= limit:
+                return out[:limit]
+        return out
+
+    def _posting_list(self, trigram: str) -> memoryview | None:
+        code = trigram_code(trigram)
+        i = bisect.bisect_left(self._trigrams, code)
+        if i == len(self._trigrams) or self._trigrams[i] != code:
+            return None
+        return self._postings[self._posting_offsets[i]:self._posting_offsets[i + 1]]
+
+    def prefix(self, query: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
+        """Rows whose name_key starts with name_key(query), in key order."""
+        wanted = name_key(query).encode("ascii")
+        if not wanted:
+            return []
+
+        def matching():
+            key_no = bisect.bisect_left(self._sorted_keys, wanted)
+            while key_no < self.keys and self.key_bytes(key_no).startswith(wanted):
+                yield key_no
+                key_no += 1
+
+        return self._collect(matching(), limit)
+
+    def contains(self, query: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
+        """
+        Rows whose name_key contains name_key(query) (the ILIKE '%...%' of the search route).
+        Candidate keys come from the shortest posting list among the query's in-word trigrams and
+        are checked against the key; queries without a 3-letter word fall back to a key scan.
+        """
+        wanted = name_key(query)
+        if not wanted:
+            return []
+        candidates = range(self.keys)
+        for trigram in {word[i:i + 3] for word in wanted.split() for i in range(len(word) - 2)}:
+            posting = self._posting_list(trigram)
+            if posting is None:
+                return []
+            if len(posting) < len(candidates):
+                candidates = posting
+        needle = wanted.encode("ascii")
+        return self._collect((k for k in candidates if needle in self.key_bytes(k)), limit)
+
+    def similar(self, query: str, limit: int = DEFAULT_LIMIT, threshold: float = SIMILARITY_THRESHOLD) -> list[tuple[float, dict]]:
+        """(similarity, row) pairs, best first: shared trigrams / union, as pg_trgm similarity()."""
+        wanted = name_trigrams(name_key(query))
+        if not wanted:
+            return []
+        shared = Counter()
+        for trigram in wanted:
+            posting = self._posting_list(trigram)
+            if posting is not None:
+                shared.update(posting)
+        scored = []
+        for key_no, common in shared.items():
+            if common < threshold * len(wanted):  # similarity <= common / len(wanted)
+                continue
+            key = self.key_bytes(key_no).decode("ascii")
+            score = common / (len(wanted) + len(name_trigrams(key)) - common)
+            if score >= threshold:
+                scored.append((score, key_no))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        out = []
+        for score, key_no in scored:
+            out.extend((round(score, 3), row) for row in self.rows(key_no))
+            if len(out) >= limit:
+                break
+        return out[:limit]
+
+
+SEARCHES = ("prefix", "contains", "similar")
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Look a name up in an attestation snapshot (one JSON row per line).")
+    ap.add_argument("snapshot", help="file written by parser_attestation.py --snapshot")
+    ap.add_argument("name")
+    ap.add_argument("--search", choices=SEARCHES, default="prefix")
+    ap.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    args = ap.parse_args(argv)
+    with AttestationSnapshot(args.snapshot) as snap:
+        found = getattr(snap, args.search)(args.name, args.limit)
+        for item in found:
+            if args.search == "similar":
+                score, item = item
+                item = {"similarity": score, **item}
+            print(json.dumps(item, ensure_ascii=False))
+    raise SystemExit(0 if found else 1)
+
+
+if __name__ == "__main__":
+    main()
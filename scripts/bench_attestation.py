@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for parser_attestation.py.
+Serves recorded category/post pages (scripts/fixtures/attestation) and synthetic
+large tables from a local HTTP server, points SOURCES at it and measures each stage
+(fetch, parse, load, full pipeline) in a fresh process: throughput and peak RSS.
+The lookup stage compares name search latency (p50/p99): the search route's ILIKE query
+against the mmap snapshot of attestation_lookup.py (prefix, contains, similar).
+DB stages need BENCH_DATABASE_URL (or --database-url) with the attestation_people
+schema; they only write to TEMP tables.
+"""
+
+import os
+import re
+import tempfile
+import json
+import time
+import logging
+import argparse
+import resource
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, time as dt_time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import parser_attestation as parser
+from attestation_lookup import AttestationSnapshot
+
+logger = logging.getLogger("bench_attestation")
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "attestation")
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_QUERIES = 500
+LOOKUP_SEARCHES = ("ilike", "prefix", "contains", "similar")
+# Запрос /attestation/search: contains по full_name_normalized или префикс name_key.
+ILIKE_QUERY = """
+    SELECT full_name, specialty, region, stage, profession, exam_date, exam_time, source_url, published_date
+    FROM bench_attestation_people
+    WHERE full_name_normalized ILIKE '%%' || %s || '%%' OR name_key LIKE %s || '%%'
+    ORDER BY exam_date DESC NULLS LAST, published_date DESC NULLS LAST
+    LIMIT 50
+"""
+
+SURNAMES = (
+    "Абдуллаев", "Каримова", "Rahimov", "Юсупова", "Tursunov", "Ғофуров", "Qodirova", "Иванова",
+    "Холматов", "Xo'jayeva", "Эргашев", "Sobirova", "Nazarov", "Мирзаева", "Usmonov", "Алиева",
+)
+FIRST_NAMES = (
+    "Азизбек", "Нилуфар", "Sardor", "Гулноза", "Jasur", "Шерзод", "Madina", "Елена",
+    "Бобур", "Dilnoza", "Улуғбек", "Zuhra", "Otabek", "Малика", "Javohir", "Севара",
+)
+PATRONYMICS = ("Акмал ўғли", "Баходир қизи", "Olim o'g'li", "Эркин қизи", "Karimovich", "Рустам ўғли")
+SPECIALTIES = ("Терапия", "Педиатрия", "Xirurgiya", "Kardiologiya", "Неврология", "Stomatologiya")
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def synthetic_name(i: int) -> str:
+    return " ".join((
+        SURNAMES[i % len(SURNAMES)],
+        FIRST_NAMES[(i // len(SURNAMES)) % len(FIRST_NAMES)],
+        PATRONYMICS[(i // 7) % len(PATRONYMICS)],
+    ))
+
+
+def synthetic_post(size: int) -> str:
+    """Recorded post page with its table body replaced by `size` generated rows."""
+    template = read_fixture("post.html")
+    trs = "".join(
+        f"<tr><td>{i}</td><td>{synthetic_name(i)}</td><td>{SPECIALTIES[i % len(SPECIALTIES)]}</td>"
+        f"<td>Тошкент шаҳри</td><td>{i % 28 + 1:02d}.03.2026</td><td>{9 + i % 8:02d}:{30 * (i % 2):02d}</td></tr>\n"
+        for i in range(1, size + 1)
+    )
+    return re.sub(r"<tbody>.*</tbody>", lambda _m: f"<tbody>\n{trs}</tbody>", template, flags=re.S)
+
+
+def synthetic_rows(size: int):
+    """AttestationRow tuples for loader-only runs."""
+    for i in range(size):
+        name = synthetic_name(i)
+        normalized = parser.normalize_name(name)
+        url = f"http://bench/post/view/{i // 1000}"
+        yield parser.AttestationRow(
+            name, normalized, parser.name_key(name), *parser.search_keys(normalized),
+            SPECIALTIES[i % len(SPECIALTIES)], "Тошкент шаҳри", 1, "doctor",
+            date(2026, 3, i % 28 + 1), dt_time(9 + i % 8), url, [url], date(2026, 2, 12),
+        )
+
+
+# =====================================================
+# FIXTURE SERVER
+# =====================================================
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    /s/<scenario>/post/category/<any> -> recorded category page with links under /s/<scenario>/
+    /s/<scenario>/post/view/<id>      -> recorded post (scenario "recorded") or a synthetic table of <scenario> rows
+    """
+
+    pages: dict[str, str] = {}
+    lock = threading.Lock()
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _page(self, scenario: str, kind: str) -> str:
+        key = f"{scenario}:{kind}"
+        with self.lock:
+            if key not in self.pages:
+                if kind == "category":
+                    self.pages[key] = read_fixture("category.html").replace('href="/post/view/', f'href="/s/{scenario}/post/view/')
+                elif scenario == "recorded":
+                    self.pages[key] = read_fixture("post.html")
+                else:
+                    self.pages[key] = synthetic_post(int(scenario))
+            return self.pages[key]
+
+    def do_GET(self) -> None:
+        parts = urlparse(self.path).path.split("/")
+        if len(parts) < 5 or parts[1] != "s" or parts[4] not in ("category", "view"):
+            self.send_error(404)
+            return
+        body = self._page(parts[2], parts[4]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_fixture_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def point_sources(base_url: str, scenario: str, posts: int) -> None:
+    """Recorded scenario keeps the real SOURCES shape; synthetic ones use one category with `posts` posts."""
+    prefix = f"{base_url}/s/{scenario}"
+    if scenario == "recorded":
+        parser.SOURCES = [
+            {**source, "url": source["url"].replace("https://tmbm.ssv.uz", prefix)} for source in parser.SOURCES
+        ]
+    else:
+        parser.SOURCES = [{"url": f"{prefix}/post/category/bench", "stage": 1, "profession": "doctor", "by_region": False}]
+        parser.MAX_POSTS_PER_CATEGORY = posts
+
+
+# =====================================================
+# STAGES (each runs in its own process)
+# =====================================================
+def stage_noop() -> dict:
+    return {"items": 0}
+
+
+def stage_fetch(base_url: str, scenario: str, posts: int, concurrency: int) -> dict:
+    point_sources(base_url, scenario, posts)
+    session = parser.get_session(concurrency)
+    limiter = parser.HostRateLimiter(1e6, burst=concurrency)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        units = parser.iter_category_units()
+        pages = list(pool.map(lambda unit: parser.fetch(session, unit[2], limiter), units))
+        post_urls = [
+            link[0]
+            for (_source, _region, cat_url), html in zip(units, pages) if html
+            for link in parser.parse_category_links(html, cat_url, limit=parser.MAX_POSTS_PER_CATEGORY)
+        ]
+        pages += list(pool.map(lambda url: parser.fetch(session, url, limiter), post_urls))
+    seconds = time.perf_counter() - started
+    return {"items": len(pages), "bytes": sum(len(p or "") for p in pages), "seconds": seconds}
+
+
+def stage_parse(scenario: str, backend: str) -> dict:
+    html = read_fixture("post.html") if scenario == "recorded" else synthetic_post(int(scenario))
+    rows, _region = parser.parse_post(html, backend)
+    repeat = max(1, 20000 // max(len(rows), 1))
+    started = time.perf_counter()
+    for _ in range(repeat):
+        parser.parse_post(html, backend)
+    return {"items": len(rows) * repeat, "seconds": time.perf_counter() - started}
+
+
+def stage_load(database_url: str, size: int, loader: str) -> dict:
+    conn = parser.psycopg2.connect(database_url)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("CREATE TEMP TABLE bench_attestation_people (LIKE attestation_people INCLUDING DEFAULTS)")
+            started = time.perf_counter()
+            count = parser.insert_rows(cur, "bench_attestation_people", synthetic_rows(size), loader)
+            seconds = time.perf_counter() - started
+        conn.rollback()
+    finally:
+        conn.close()
+    return {"items": count, "seconds": seconds}
+
+
+def stage_pipeline(
+    base_url: str, scenario: str, posts: int, concurrency: int, backend: str, database_url: str | None,
+) -> dict:
+    point_sources(base_url, scenario, posts)
+    session = parser.get_session(concurrency)
+    limiter = parser.HostRateLimiter(1e6, burst=concurrency)
+    rows = parser.crawl_rows(session, limiter, concurrency, None, backend)
+    started = time.perf_counter()
+    if database_url:
+        conn = parser.psycopg2.connect(database_url)
+        try:
+            with conn.cursor() as cur:
+                cur.execute("CREATE TEMP TABLE bench_attestation_people (LIKE attestation_people INCLUDING DEFAULTS)")
+                count = parser.insert_rows(cur, "bench_attestation_people", rows)
+            conn.rollback()
+        finally:
+            conn.close()
+    else:
+        count = sum(1 for _ in rows)
+    return {"items": count, "seconds": time.perf_counter() - started}
+
+
+def lookup_queries(size: int, count: int) -> list[str]:
+    """What users type: surname + first name of a stored row, every other query the full name."""
+    step = max(1, size // count)
+    names = [synthetic_name(i) for i in range(0, size, step)][:count]
+    return [name if i % 2 else " ".join(name.split()[:2]) for i, name in enumerate(names)]
+
+
+def stage_lookup(database_url: str, size: int, search: str, queries: int) -> dict:
+    conn = parser.psycopg2.connect(database_url)
+    try:
+        with conn.cursor() as cur, tempfile.TemporaryDirectory() as tmp:
+            cur.execute(
+                "CREATE TEMP TABLE bench_attestation_people (LIKE attestation_people INCLUDING DEFAULTS INCLUDING INDEXES)"
+            )
+            parser.insert_rows(cur, "bench_attestation_people", synthetic_rows(size), "copy")
+            cur.execute("ANALYZE bench_attestation_people")
+            if search == "ilike":
+                def lookup(query: str) -> list:
+                    pattern = " ".join(parser.normalize_name(query).split()[:3])
+                    key = " ".join(parser.name_key(query).split()[:3])
+                    cur.execute(ILIKE_QUERY, (pattern, key))
+                    return cur.fetchall()
+            else:
+                path = os.path.join(tmp, "bench.snap")
+                parser.write_snapshot(conn, path, "bench_attestation_people")
+                snapshot = AttestationSnapshot(path)
+                lookup = getattr(snapshot, search)
+            latencies = []
+            found = 0
+            for query in lookup_queries(size, queries):
+                started = time.perf_counter()
+                found += bool(lookup(query))
+                latencies.append(time.perf_counter() - started)
+            if search != "ilike":
+                snapshot.close()
+        conn.rollback()
+    finally:
+        conn.close()
+    latencies.sort()
+    return {
+        "items": len(latencies),
+        "seconds": sum(latencies),
+        "found": found,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+STAGES = {
+    "noop": stage_noop,
+    "fetch": stage_fetch,
+    "parse": stage_parse,
+    "load": stage_load,
+    "pipeline": stage_pipeline,
+    "lookup": stage_lookup,
+}
+
+
+def run_stage(name: str, kwargs: dict, verbose: bool) -> dict:
+    """Child process entry point: run one stage and attach this process's peak RSS."""
+    if not verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    result = STAGES[name](**kwargs)
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def measure(name: str, kwargs: dict, verbose: bool) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(run_stage, name, kwargs, verbose).result()
+
+
+# =====================================================
+# REPORT
+# =====================================================
+UNITS = {"fetch": "pages/s", "parse": "rows/s", "load": "db rows/s", "pipeline": "rows/s", "lookup": "queries/s"}
+
+
+def result_key(r: dict) -> tuple:
+    return r["stage"], r["scenario"], r["variant"]
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """Regressions vs a saved run: throughput lower or peak RSS higher by more than `tolerance`."""
+    base = {result_key(r): r for r in baseline}
+    problems = []
+    for r in results:
+        b = base.get(result_key(r))
+        if not b:
+            continue
+        label = "/".join(str(x) for x in result_key(r))
+        if b["rate"] and r["rate"] < b["rate"] * (1 - tolerance):
+            problems.append(f"{label}: {r['rate']:.0f} {r['unit']} vs baseline {b['rate']:.0f}")
+        if b["peak_rss_mb"] and r["peak_rss_mb"] > b["peak_rss_mb"] * (1 + tolerance):
+            problems.append(f"{label}: peak RSS {r['peak_rss_mb']:.1f} MB vs baseline {b['peak_rss_mb']:.1f} MB")
+    return problems
+
+
+def print_report(results: list[dict], idle_rss: float) -> None:
+    print(f"{'stage':<9} {'scenario':<9} {'variant':<9} {'items':>9} {'sec':>8} {'rate':>12} {'unit':<10} {'peak RSS':>9}")
+    for r in results:
+        print(
+            f"{r['stage']:<9} {r['scenario']:<9} {r['variant']:<9} {r['items']:>9} {r['seconds']:>8.2f} "
+            f"{r['rate']:>12.0f} {r['unit']:<10} {r['peak_rss_mb']:>7.1f}MB"
+            + (f"  p50 {r['p50_ms']:.2f} ms, p99 {r['p99_ms']:.2f} ms" if "p50_ms" in r else "")
+        )
+    print(f"(idle interpreter with imports: {idle_rss:.1f} MB)")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    available = [b for b in parser.HTML_BACKENDS if b != "lxml" or parser.lxml_html is not None]
+    ap = argparse.ArgumentParser(description="Offline benchmark for parser_attestation.py")
+    ap.add_argument("--stages", default="fetch,parse,load,pipeline", help="comma-separated stages")
+    ap.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="synthetic table sizes (rows per post)")
+    ap.add_argument("--backends", default=",".join(available), help="HTML backends for parse/pipeline")
+    ap.add_argument("--loaders", default="copy,values", help="DB loaders for the load stage")
+    ap.add_argument("--posts", type=int, default=2, help="posts per synthetic category")
+    ap.add_argument("--queries", type=int, default=DEFAULT_QUERIES, help="name lookups per lookup variant")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"), help="env BENCH_DATABASE_URL")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--baseline", help="compare with a previous --json file, exit 1 on regression")
+    ap.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed relative regression")
+    ap.add_argument("--verbose", action="store_true", help="keep parser INFO logs")
+    return ap.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    stages = [s for s in args.stages.split(",") if s]
+    scenarios = ["recorded"] + [s.strip() for s in args.sizes.split(",") if s.strip()]
+    backends = [b for b in args.backends.split(",") if b]
+    loaders = [b for b in args.loaders.split(",") if b]
+
+    server = start_fixture_server()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    logger.info("Fixture server on %s", base_url)
+
+    plan = []
+    for scenario in scenarios:
+        if "fetch" in stages:
+            plan.append(("fetch", scenario, "-", dict(
+                base_url=base_url, scenario=scenario, posts=args.posts, concurrency=args.concurrency)))
+        if "parse" in stages:
+            plan += [("parse", scenario, b, dict(scenario=scenario, backend=b)) for b in backends]
+        if "pipeline" in stages:
+            plan += [("pipeline", scenario, b, dict(
+                base_url=base_url, scenario=scenario, posts=args.posts, concurrency=args.concurrency,
+                backend=b, database_url=args.database_url)) for b in backends]
+        if "load" in stages and scenario != "recorded":
+            if not args.database_url:
+                logger.warning("load stage skipped: no --database-url / BENCH_DATABASE_URL")
+            else:
+                plan += [("load", scenario, loader, dict(
+                    database_url=args.database_url, size=int(scenario), loader=loader)) for loader in loaders]
+        if "lookup" in stages and scenario != "recorded":
+            if not args.database_url:
+                logger.warning("lookup stage skipped: no --database-url / BENCH_DATABASE_URL")
+            else:
+                plan += [("lookup", scenario, search, dict(
+                    database_url=args.database_url, size=int(scenario), search=search, queries=args.queries,
+                )) for search in LOOKUP_SEARCHES]
+
+    idle_rss = measure("noop", {}, args.verbose)["peak_rss_mb"]
+    results = []
+    for stage, scenario, variant, kwargs in plan:
+        logger.info("Running %s %s %s", stage, scenario, variant)
+        r = measure(stage, kwargs, args.verbose)
+        r.update(stage=stage, scenario=scenario, variant=variant, unit=UNITS[stage])
+        r["rate"] = r["items"] / r["seconds"] if r["seconds"] else 0.0
+        results.append(r)
+    server.shutdown()
+
+    print_report(results, idle_rss)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"idle_rss_mb": idle_rss, "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        problems = compare(results, baseline, args.tolerance)
+        for p in problems:
+            logger.error("REGRESSION %s", p)
+        if problems:
+            raise SystemExit(1)
+        logger.info("No regressions vs %s (tolerance %.0f%%)", args.baseline, args.tolerance * 100)
+
+
+if __name__ == "__main__":
+    main()
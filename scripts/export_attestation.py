@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Export attestation_people to CSV, gzip-compressed CSV or Parquet.
+Rows are streamed: CSV goes through COPY ... TO STDOUT straight into the output file,
+Parquet is written in row groups from a named (server-side) cursor, so memory stays
+constant whatever the table size. Filters: stage, profession, published_date range.
+Requires: DATABASE_URL in environment (same as parser_attestation.py); Parquet needs pyarrow.
+"""
+
+import os
+import sys
+import gzip
+import time
+import argparse
+from datetime import date, timedelta
+
+import parser_attestation as parser
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional: only --format parquet needs it
+    pyarrow = None
+
+logger = parser.logger
+
+FORMATS = ("csv", "csv.gz", "parquet")
+DEFAULT_OUTPUT = "attestation_export.csv"
+# Строк в одной группе Parquet и в одной выборке серверного курсора.
+PARQUET_BATCH_ROWS = int(os.environ.get("ATTESTATION_EXPORT_BATCH", "50000"))
+
+EXPORT_COLUMNS = (
+    "full_name",
+    "full_name_normalized",
+    "name_key",
+    "specialty",
+    "region",
+    "stage",
+    "profession",
+    "exam_date",
+    "exam_time",
+    "source_url",
+    "source_urls",
+    "published_date",
+)
+EXPORT_ORDER = "source_url, full_name_normalized, stage, exam_date"
+
+
+def parquet_schema():
+    return pyarrow.schema([
+        ("full_name", pyarrow.string()),
+        ("full_name_normalized", pyarrow.string()),
+        ("name_key", pyarrow.string()),
+        ("specialty", pyarrow.string()),
+        ("region", pyarrow.string()),
+        ("stage", pyarrow.int32()),
+        ("profession", pyarrow.string()),
+        ("exam_date", pyarrow.date32()),
+        ("exam_time", pyarrow.time64("us")),
+        ("source_url", pyarrow.string()),
+        ("source_urls", pyarrow.list_(pyarrow.string())),
+        ("published_date", pyarrow.timestamp("ms")),
+    ])
+
+
+def detect_format(output: str) -> str:
+    """Output file extension -> export format; stdout and unknown extensions are CSV."""
+    for fmt in sorted(FORMATS, key=len, reverse=True):
+        if output.endswith("." + fmt):
+            return fmt
+    return "csv"
+
+
+def export_query(cur, stages=None, professions=None, published_from=None, published_to=None) -> str:
+    """SELECT over EXPORT_COLUMNS with the filters bound client-side (COPY takes no parameters)."""
+    where, params = [], []
+    if stages:
+        where.append("stage = ANY(%s)")
+        params.append(list(stages))
+    if professions:
+        where.append("profession = ANY(%s)")
+        params.append(list(professions))
+    if published_from:
+        where.append("published_date >= %s")
+        params.append(published_from)
+    if published_to:
+        where.append("published_date < %s")
+        params.append(published_to + timedelta(days=1))
+    sql = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM attestation_people"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {EXPORT_ORDER}"
+    return cur.mogrify(sql, params).decode("utf-8")
+
+
+def export_csv(conn, query: str, out) -> int:
+    """COPY the query result into a binary file object; returns the number of rows."""
+    with conn.cursor() as cur:
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", out, size=parser.COPY_BUFFER_SIZE)
+        return cur.rowcount
+
+
+def export_parquet(conn, query: str, path: str, batch_rows: int = PARQUET_BATCH_ROWS) -> int:
+    """Fetch through a named cursor and write one Parquet row group per batch."""
+    schema = parquet_schema()
+    count = 0
+    with conn.cursor(name="attestation_export") as cur:
+        cur.itersize = batch_rows
+        cur.execute(query)
+        with pyarrow.parquet.ParquetWriter(path, schema, compression="zstd") as writer:
+            while batch := cur.fetchmany(batch_rows):
+                columns = zip(*batch)
+                writer.write_table(pyarrow.Table.from_arrays(
+                    [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)],
+                    schema=schema,
+                ))
+                count += len(batch)
+    return count
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Export attestation_people (streamed, constant memory).")
+    ap.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help=f"output file or - for stdout (default {DEFAULT_OUTPUT})")
+    ap.add_argument("--format", choices=FORMATS, help="default: from the output extension (.csv, .csv.gz, .parquet)")
+    ap.add_argument("--stage", type=int, action="append", help="only this stage (repeatable)")
+    ap.add_argument("--profession", action="append", help="only this profession (repeatable)")
+    ap.add_argument("--published-from", type=date.fromisoformat, metavar="YYYY-MM-DD", help="published_date on or after")
+    ap.add_argument("--published-to", type=date.fromisoformat, metavar="YYYY-MM-DD", help="published_date on or before")
+    return ap.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    fmt = args.format or detect_format(args.output)
+    to_stdout = args.output == "-"
+    if fmt == "parquet" and (pyarrow is None or to_stdout):
+        logger.error("Parquet export needs pyarrow and an output file (pip install pyarrow)")
+        raise SystemExit(1)
+
+    conn = parser.connect_db()
+    started = time.monotonic()
+    try:
+        # Один снимок таблицы на всю выгрузку, даже если парсер пишет в неё параллельно.
+        conn.set_session(readonly=True, isolation_level="REPEATABLE READ")
+        with conn.cursor() as cur:
+            query = export_query(cur, args.stage, args.profession, args.published_from, args.published_to)
+        if to_stdout:
+            if fmt == "csv.gz":
+                with gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb") as out:
+                    count = export_csv(conn, query, out)
+            else:
+                count = export_csv(conn, query, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+        else:
+            # Файл появляется под своим именем только целиком: прерванная выгрузка не оставляет обрывок.
+            tmp = args.output + ".tmp"
+            try:
+                if fmt == "parquet":
+                    count = export_parquet(conn, query, tmp)
+                else:
+                    with gzip.open(tmp, "wb") if fmt == "csv.gz" else open(tmp, "wb") as out:
+                        count = export_csv(conn, query, out)
+                os.replace(tmp, args.output)
+            finally:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+        conn.rollback()
+    except Exception as e:
+        logger.exception("Export failed: %s", e)
+        raise SystemExit(1)
+    finally:
+        conn.close()
+    logger.info(
+        "Exported %d rows as %s to %s in %.2fs (peak RSS %.1f MB)",
+        count, fmt, "stdout" if to_stdout else args.output, time.monotonic() - started, parser.peak_rss_mb(),
+    )
+
+
+if __name__ == "__main__":
+    main()
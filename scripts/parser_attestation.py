@@ -3,30 +3,175 @@
 Daily cron-ready parser for attestation lists from tmbm.ssv.uz.
 Fetches first 5 publications per category (no pagination, no archive before 2025),
 parses HTML tables, normalizes names, and upserts into attestation_people.
+Pages are fetched concurrently through a per-host, rate-limited thread pool.
 Requires: DATABASE_URL in environment.
 """
 
 import os
 import re
+import json
 import time
 import uuid
+import random
+import shutil
+import struct
+import hashlib
 import logging
-from datetime import datetime
+import tempfile
+import signal
+import bisect
+import argparse
+import resource
+import threading
+import socketserver
+from array import array
+from collections import deque
+import multiprocessing
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, time as dt_time, timezone
+from itertools import accumulate, islice
+from typing import NamedTuple
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from urllib.parse import urljoin, urlparse, urlunparse
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
 import psycopg2
 from psycopg2.extras import execute_values
 
+try:
+    import lxml.html as lxml_html
+except ImportError:  # optional fast HTML backend
+    lxml_html = None
+
+try:
+    import brotli  # urllib3 decodes "br" responses when brotli or brotlicffi is installed
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+ACCEPT_ENCODING = "gzip, deflate, br" if brotli is not None else "gzip, deflate"
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 USER_AGENT = "ZiyoMed-Attestation-Parser/1.0"
 TIMEOUT = 10
-SLEEP_BETWEEN_REQUESTS = 1
 MAX_POSTS_PER_CATEGORY = 10
 MIN_PUBLISH_YEAR = 2025
+REGION_IDS = list(range(1, 15))
+
+# Параллельная загрузка: число потоков и потолок запросов в секунду на один хост.
+CONCURRENCY = int(os.environ.get("ATTESTATION_CONCURRENCY", "6"))
+MAX_REQUESTS_PER_SECOND = float(os.environ.get("ATTESTATION_RPS", "5"))
+MIN_REQUESTS_PER_SECOND = 0.2
+# Повторы GET при обрыве соединения, таймауте, 429 и 5xx: экспоненциальная задержка со случайным разбросом.
+RETRY_ATTEMPTS = int(os.environ.get("ATTESTATION_RETRIES", "3"))
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_MAX = 30.0
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+MAX_RETRY_AFTER = 120.0
+LATENCY_SLACK = 0.25  # сек: меньший рост задержки не считается перегрузкой
+
+# Кэш ответов: ETag/Last-Modified для условных GET и разобранные строки постов по хэшу содержимого.
+CACHE_DIR = os.environ.get(
+    "ATTESTATION_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".attestation-cache"),
+)
+# Записи кэша, которые ни один прогон не читал и не писал дольше стольких дней (пост убрали с сайта,
+# сменился адрес), удаляются в конце прогона. 0 — не чистить.
+CACHE_MAX_AGE_DAYS = float(os.environ.get("ATTESTATION_CACHE_MAX_AGE_DAYS", "30"))
+CACHE_SUFFIXES = (".html", ".json", ".parsed.json")
+# Версия разбора постов: кэш разобранных строк и журнал прогона другой версии не используются.
+# Увеличивать при любом изменении результата parse_post / row_from_cells / rows_from_table.
+PARSE_VERSION = 1
+
+# Журнал прогона: завершённые категории и посты; прерванный прогон продолжается с места остановки.
+# Пустой путь — checkpoint.jsonl в каталоге кэша. Журнал старше CHECKPOINT_MAX_AGE часов не используется.
+CHECKPOINT_PATH = os.environ.get("ATTESTATION_CHECKPOINT", "")
+CHECKPOINT_MAX_AGE = float(os.environ.get("ATTESTATION_CHECKPOINT_MAX_AGE", "12"))
+
+# lxml — быстрый разбор; bs4 — html.parser, на страницах категорий только по ссылкам; bs4-full — полный html.parser (прежний).
+HTML_BACKENDS = ("lxml", "bs4", "bs4-full")
+HTML_BACKEND = os.environ.get("ATTESTATION_HTML_BACKEND", "auto")
+_SKIP_TEXT_TAGS = frozenset(("script", "style", "template"))
+
+DATE_RE = re.compile(r"\d{1,2}\.\d{1,2}\.\d{4}")
+TIME_RE = re.compile(r"\b\d{1,2}:\d{2}\b")
+TIME_PREFIX_RE = re.compile(r"\d{1,2}:\d{2}")
+POST_TITLE_DATE_RE = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})\s*[-–—]")
+# Ячейки даты/времени экзамена приводятся к DATE/TIME при нормализации; нераспознанные -> NULL.
+EXAM_DATE_RE = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})")
+EXAM_TIME_RE = re.compile(r"\b(\d{1,2}):(\d{2})\b")
+
+# Схема колонок таблицы: заголовок ищем в первых строках, иначе угадываем по выборке строк.
+HEADER_SCAN_ROWS = 5
+SCHEMA_SAMPLE_ROWS = 20
+HEADER_KEYWORDS = (
+    ("datetime", ("сана ва вақт", "сана ва вакт", "sana va vaqt", "дата и время")),
+    ("name", ("ф.и.", "фио", "ф.и.ш", "ф.и.о", "f.i.sh", "f.i.o", "фамил", "familiya", "исми", "ismi")),
+    ("specialty", ("мутахассис", "mutaxassis", "специальн", "йўналиш", "yo'nalish", "направлен", "лавозим", "lavozim")),
+    ("region", ("ҳудуд", "худуд", "hudud", "вилоят", "viloyat", "регион", "област", "туман", "tuman")),
+    ("date", ("сана", "sana", "дата")),
+    ("time", ("вақт", "вакт", "vaqt", "время", "соат", "soat")),
+)
+
+# incremental — применяем только разницу через staging-таблицу; replace — DELETE + полная вставка.
+LOAD_MODE = os.environ.get("ATTESTATION_LOAD_MODE", "incremental")
+# copy — потоковый COPY FROM STDIN; values — execute_values (прежний способ).
+LOADER = os.environ.get("ATTESTATION_LOADER", "copy")
+COPY_BUFFER_SIZE = 1 << 20
+LOAD_BATCH_SIZE = 5000
+# Сколько страниц (на один поток) может быть загружено, но ещё не разобрано.
+FETCH_WINDOW_FACTOR = 2
+# Процессы для разбора HTML постов; 0/1 — разбор в основном процессе.
+PARSE_WORKERS = int(os.environ.get("ATTESTATION_WORKERS", "0"))
+
+# Режим --watch: опрашиваются только страницы категорий; без новых постов интервал растёт
+# в WATCH_BACKOFF раз до максимума, при новых — сбрасывается к минимуму.
+WATCH_MIN_INTERVAL = float(os.environ.get("ATTESTATION_WATCH_MIN_INTERVAL", "120"))
+WATCH_MAX_INTERVAL = float(os.environ.get("ATTESTATION_WATCH_MAX_INTERVAL", "1800"))
+WATCH_BACKOFF = 1.5
+# Новый пост, который не загрузился столько циклов подряд, процесс больше не запрашивает
+# (его подберёт обычный полный прогон); интервал сбрасывают только загруженные посты.
+WATCH_MAX_POST_RETRIES = int(os.environ.get("ATTESTATION_WATCH_MAX_POST_RETRIES", "3"))
+
+# Метрики прогона: JSON-сводка и файл для textfile collector node_exporter (пусто — не писать).
+METRICS_JSON = os.environ.get("ATTESTATION_METRICS_JSON", "")
+METRICS_PROM = os.environ.get("ATTESTATION_METRICS_PROM", "")
+METRICS_PREFIX = "attestation_parser"
+# Границы корзин гистограммы времени стадий, сек.
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Снимок для поиска без БД (attestation_lookup.py): строки, отсортированные по name_key, и триграммный
+# индекс по различным ключам в одном файле для mmap. Пишется после успешной загрузки; пустой путь — не писать.
+SNAPSHOT_PATH = os.environ.get("ATTESTATION_SNAPSHOT", "")
+SNAPSHOT_MAGIC = b"ATTSNAP1"
+# magic, строк, различных ключей, триграмм, байт ключей, байт строк, время создания (unix)
+SNAPSHOT_HEADER = struct.Struct("<8sIIIIIQ")
+SNAPSHOT_FIELDS = (
+    "full_name", "specialty", "region", "stage", "profession",
+    "exam_date", "exam_time", "source_url", "source_urls", "published_date",
+)
+
+# Канонический ключ имени (name_key): кириллица -> латиница, апострофы убираются,
+# частые варианты написания (х/ҳ/x/kh, қ/q/k, ж/zh/dj, ye/e, -iy/-ii/-i) сводятся к одному.
+# Та же таблица — в nameKey (apps/api/src/modules/attestation/normalize.ts).
+NAME_KEY_CHARS = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "ғ": "g", "д": "d", "е": "e", "ё": "yo", "ж": "j",
+    "з": "z", "и": "i", "й": "y", "к": "k", "қ": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ў": "o", "ф": "f", "х": "h", "ҳ": "h",
+    "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "", "ы": "i", "ь": "", "э": "e", "ю": "yu",
+    "я": "ya", "x": "h", "q": "k",
+    "'": "", "`": "", "\u2018": "", "\u2019": "", "\u02bb": "", "\u02bc": "", "-": " ",
+})
+NAME_KEY_DROP_RE = re.compile(r"[^a-z0-9\s]+")
+NAME_KEY_DIGRAPHS = {"dzh": "j", "kh": "h", "zh": "j", "dj": "j", "ye": "e", "iy": "i", "ii": "i"}
+NAME_KEY_DIGRAPH_RE = re.compile(r"dzh|kh|zh|dj|ye|iy\b|ii\b")
 
 # testers_doctors — одна страница без кнопок регионов, сразу список ссылок по датам.
 # Остальные категории — с переключателем регионов ?l=1..14.
@@ -48,6 +193,27 @@ def normalize_name(name: str) -> str:
     return s.strip()
 
 
+def name_key(name: str) -> str:
+    """
+    Transliteration-insensitive key: "Қодиров Ҳасан", "Qodirov Hasan" and "Kodirov Khasan" all -> "kodirov hasan".
+    Vowels are not folded: "Kadirov Khasan" -> "kadirov hasan" stays a different key.
+    """
+    if not name or not isinstance(name, str):
+        return ""
+    s = NAME_KEY_DROP_RE.sub("", name.lower().translate(NAME_KEY_CHARS))
+    s = " ".join(s.split())
+    return NAME_KEY_DIGRAPH_RE.sub(lambda m: NAME_KEY_DIGRAPHS[m.group(0)], s)
+
+
+def search_keys(normalized: str) -> tuple[str, list[str]]:
+    """
+    Search columns for a normalized name: first three words (firstThreeWords in normalize.ts)
+    and the distinct words in order (name_tokens, GIN-indexed).
+    """
+    words = normalized.split()
+    return " ".join(words[:3]), list(dict.fromkeys(words))
+
+
 def url_with_region(url: str, region_id: int) -> str:
     """Add or replace ?l=region_id in category URL."""
     parsed = urlparse(url)
@@ -61,40 +227,687 @@ def url_with_region(url: str, region_id: int) -> str:
     return urlunparse((parsed.scheme, parsed.netloc, parsed.path, parsed.params, new_query, parsed.fragment))
 
 
-def get_session() -> requests.Session:
-    return requests.Session()
+def get_session(pool_size: int = CONCURRENCY) -> requests.Session:
+    """
+    Keep-alive session whose connection pool fits the crawl concurrency (the requests default of
+    10 would drop and reopen connections above that) and that asks for compressed pages.
+    Retries are done by fetch(), not by urllib3, so they go through the rate limiter.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(pool_size, 1), max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "User-Agent": USER_AGENT,
+        "Accept-Encoding": ACCEPT_ENCODING,
+        "Connection": "keep-alive",
+    })
+    return session
+
+
+class _HostState:
+    __slots__ = ("rate", "tokens", "updated", "blocked_until", "latency", "best_latency")
 
+    def __init__(self, rate: float, tokens: float) -> None:
+        self.rate = rate
+        self.tokens = tokens
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.latency: float | None = None
+        self.best_latency: float | None = None
 
-def fetch(session: requests.Session, url: str) -> str | None:
+
+class HostRateLimiter:
+    """
+    Per-host token bucket shared by all fetch threads.
+    Rate drops when latency grows or the server answers 429/503 with Retry-After,
+    and slowly climbs back to max_rate while responses stay fast.
+    """
+
+    def __init__(self, max_rate: float, burst: int = 1, min_rate: float = MIN_REQUESTS_PER_SECOND):
+        self.max_rate = max(max_rate, min_rate)
+        self.min_rate = min_rate
+        self.burst = max(burst, 1)
+        self._lock = threading.Lock()
+        self._hosts: dict[str, _HostState] = {}
+
+    def _state(self, host: str) -> _HostState:
+        st = self._hosts.get(host)
+        if st is None:
+            st = _HostState(self.max_rate, float(self.burst))
+            self._hosts[host] = st
+        return st
+
+    def acquire(self, url: str) -> None:
+        host = urlparse(url).netloc
+        while True:
+            with self._lock:
+                st = self._state(host)
+                now = time.monotonic()
+                if now < st.blocked_until:
+                    wait = st.blocked_until - now
+                else:
+                    st.tokens = min(float(self.burst), st.tokens + (now - st.updated) * st.rate)
+                    st.updated = now
+                    if st.tokens >= 1:
+                        st.tokens -= 1
+                        return
+                    wait = (1 - st.tokens) / st.rate
+            time.sleep(wait)
+
+    def observe(self, url: str, latency: float) -> None:
+        """Adapt rate to observed latency (EWMA vs best seen so far)."""
+        host = urlparse(url).netloc
+        with self._lock:
+            st = self._state(host)
+            st.latency = latency if st.latency is None else 0.7 * st.latency + 0.3 * latency
+            if st.best_latency is None or st.latency < st.best_latency:
+                st.best_latency = st.latency
+            if st.latency > 2 * st.best_latency and st.latency - st.best_latency > LATENCY_SLACK:
+                st.rate = max(self.min_rate, st.rate * 0.75)
+            else:
+                st.rate = min(self.max_rate, st.rate + self.max_rate * 0.05)
+
+    def defer(self, url: str, seconds: float) -> None:
+        """Block the host for `seconds` (Retry-After) and halve its rate."""
+        host = urlparse(url).netloc
+        with self._lock:
+            st = self._state(host)
+            until = time.monotonic() + seconds
+            if until > st.blocked_until:
+                st.blocked_until = until
+                st.updated = until
+                st.tokens = 0.0
+            st.rate = max(self.min_rate, st.rate / 2)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After is either delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
     try:
-        r = session.get(
-            url,
-            headers={"User-Agent": USER_AGENT},
-            timeout=TIMEOUT,
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+def write_file_atomic(path: str, data: str) -> None:
+    """Write via a temp file in the same directory + rename, so readers never see a partial file."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class _Histogram:
+    __slots__ = ("buckets", "count", "sum", "max")
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(STAGE_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+class RunMetrics:
+    """
+    Thread-safe timings and counters for one parser run.
+    observe() feeds a fixed-bucket histogram per stage (fetch, parse, normalize, load, apply);
+    inc() adds to a counter keyed by name + labels (source, region, status, ...).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self._stages: dict[str, _Histogram] = {}
+            self._counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+            self._failures: dict[str, dict] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        i = bisect.bisect_left(STAGE_BUCKETS, seconds)
+        with self._lock:
+            h = self._stages.get(stage)
+            if h is None:
+                h = self._stages[stage] = _Histogram()
+            h.buckets[i] += 1
+            h.count += 1
+            h.sum += seconds
+            if seconds > h.max:
+                h.max = seconds
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def record_failure(self, url: str, reason: str | None, attempts: int) -> None:
+        """Last failure per URL, listed in the summary so a run's gaps can be traced to pages."""
+        with self._lock:
+            self._failures[url] = {"url": url, "reason": reason, "attempts": attempts}
+
+    def total(self, name: str) -> float:
+        with self._lock:
+            return sum(v for (n, _labels), v in self._counters.items() if n == name)
+
+    def summary(self, status: str, **extra) -> dict:
+        """JSON-ready run summary; histogram buckets are cumulative, as in Prometheus."""
+        finished = time.time()
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": h.count,
+                    "sum": round(h.sum, 6),
+                    "avg": round(h.sum / h.count, 6) if h.count else 0.0,
+                    "max": round(h.max, 6),
+                    "buckets": dict(zip([f"{le:g}" for le in STAGE_BUCKETS] + ["+Inf"], accumulate(h.buckets))),
+                }
+                for stage, h in sorted(self._stages.items())
+            }
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            failures = sorted(self._failures.values(), key=lambda f: f["url"])
+        return {
+            "status": status,
+            "started_at": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            "finished_at": datetime.fromtimestamp(finished, timezone.utc).isoformat(),
+            "duration_seconds": round(finished - self.started, 3),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            **extra,
+            "stages": stages,
+            "counters": counters,
+            "failures": failures,
+        }
+
+
+metrics = RunMetrics()
+
+
+def _prom_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_prom_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _prom_escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(summary: dict) -> str:
+    """Render a run summary in the node_exporter textfile format (values of the last run)."""
+    p = METRICS_PREFIX
+    finished = datetime.fromisoformat(summary["finished_at"]).timestamp()
+    lines = [
+        f"# HELP {p}_last_run_timestamp_seconds Unix time the last parser run finished.",
+        f"# TYPE {p}_last_run_timestamp_seconds gauge",
+        f"{p}_last_run_timestamp_seconds {finished:.3f}",
+        f"# HELP {p}_run_duration_seconds Wall time of the last parser run.",
+        f"# TYPE {p}_run_duration_seconds gauge",
+        f"{p}_run_duration_seconds {summary['duration_seconds']}",
+        f"# HELP {p}_run_success 1 if the last run committed its rows.",
+        f"# TYPE {p}_run_success gauge",
+        f"{p}_run_success {int(summary['status'] == 'ok')}",
+        f"# HELP {p}_run_status Status of the last run (ok, empty, failed, terminated).",
+        f"# TYPE {p}_run_status gauge",
+        f"{p}_run_status{_prom_labels({'status': summary['status']})} 1",
+        f"# HELP {p}_peak_rss_bytes Peak resident memory of the last run.",
+        f"# TYPE {p}_peak_rss_bytes gauge",
+        f"{p}_peak_rss_bytes {int(summary['peak_rss_mb'] * 1024 * 1024)}",
+        f"# HELP {p}_stage_duration_seconds Per-item time spent in each stage of the last run.",
+        f"# TYPE {p}_stage_duration_seconds histogram",
+    ]
+    for stage, h in summary["stages"].items():
+        for le, count in h["buckets"].items():
+            lines.append(f"{p}_stage_duration_seconds_bucket{_prom_labels({'stage': stage, 'le': le})} {count}")
+        lines.append(f"{p}_stage_duration_seconds_sum{_prom_labels({'stage': stage})} {h['sum']}")
+        lines.append(f"{p}_stage_duration_seconds_count{_prom_labels({'stage': stage})} {h['count']}")
+    seen = set()
+    for c in summary["counters"]:
+        name = f"{p}_{c['name']}"
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{_prom_labels(c['labels'])} {c['value']:g}")
+    return "\n".join(lines) + "\n"
+
+
+def write_run_summary(status: str, json_path: str | None, prom_path: str | None, **extra) -> dict:
+    """Log the run summary and write it to the JSON / Prometheus textfile paths that are set."""
+    summary = metrics.summary(status, **extra)
+    stages = ", ".join(f"{k}={v['sum']:.2f}s/{v['count']}" for k, v in summary["stages"].items())
+    logger.info("Run summary: status=%s in %.1fs; %s", status, summary["duration_seconds"], stages or "no stages")
+    for path, render in ((json_path, lambda s: json.dumps(s, ensure_ascii=False, indent=2)), (prom_path, prometheus_text)):
+        if not path:
+            continue
+        try:
+            write_file_atomic(path, render(summary))
+        except OSError as e:
+            logger.warning("Metrics write failed %s -> %s", path, e)
+    return summary
+
+
+def content_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class HttpCache:
+    """
+    On-disk cache of fetched pages keyed by URL.
+    Stores ETag/Last-Modified for conditional GETs plus a sha256 of the body;
+    parsed post results are kept per body hash and PARSE_VERSION, so an unchanged post is not
+    parsed again until the parser itself changes.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, url: str, suffix: str) -> str:
+        return os.path.join(self.root, hashlib.sha256(url.encode("utf-8")).hexdigest() + suffix)
+
+    def _read_json(self, path: str) -> dict | None:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path: str, data: str) -> None:
+        try:
+            write_file_atomic(path, data)
+        except OSError as e:
+            logger.warning("Cache write failed %s -> %s", path, e)
+
+    def conditional_headers(self, url: str) -> dict:
+        meta = self._read_json(self._path(url, ".json"))
+        if not meta or not os.path.exists(self._path(url, ".html")):
+            return {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def load_body(self, url: str) -> str | None:
+        path = self._path(url, ".html")
+        try:
+            with open(path, encoding="utf-8") as f:
+                body = f.read()
+            # 304: страница по-прежнему нужна, prune() смотрит на mtime
+            os.utime(path)
+        except OSError:
+            return None
+        return body
+
+    def store(self, url: str, response: requests.Response, body: str) -> None:
+        self._write(self._path(url, ".html"), body)
+        self._write(self._path(url, ".json"), json.dumps({
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "sha256": content_digest(body),
+            "fetched_at": datetime.now(timezone.utc).isoformat(),
+        }))
+
+    def load_parsed(self, url: str, digest: str) -> tuple[list[dict], str | None] | None:
+        data = self._read_json(self._path(url, ".parsed.json"))
+        if not data or data.get("sha256") != digest or data.get("parse_version") != PARSE_VERSION:
+            return None
+        return data.get("rows") or [], data.get("region")
+
+    def store_parsed(self, url: str, digest: str, rows: list[dict], region: str | None) -> None:
+        self._write(
+            self._path(url, ".parsed.json"),
+            json.dumps(
+                {"sha256": digest, "parse_version": PARSE_VERSION, "region": region, "rows": rows},
+                ensure_ascii=False,
+            ),
         )
-        r.raise_for_status()
-        size = len(r.text) if r.text else 0
-        logger.info("GET OK %s -> %d bytes", url, size)
-        return r.text
-    except Exception as e:
-        logger.warning("GET FAIL %s -> %s", url, e)
+
+    def prune(self, max_age_days: float) -> int:
+        """
+        Remove the entries (page, metadata, parsed rows of one URL) none of whose files was written
+        or re-read in the last max_age_days days. Other files in the directory (the checkpoint
+        journal) are left alone. Returns the number of URLs removed.
+        """
+        cutoff = time.time() - max_age_days * 86400
+        entries: dict[str, list[str]] = {}
+        newest: dict[str, float] = {}
+        try:
+            names = os.listdir(self.root)
+        except OSError as e:
+            logger.warning("Cache prune failed %s -> %s", self.root, e)
+            return 0
+        for name in names:
+            key, _, suffix = name.partition(".")
+            if len(key) != 64 or "." + suffix not in CACHE_SUFFIXES:
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            entries.setdefault(key, []).append(path)
+            newest[key] = max(newest.get(key, 0.0), mtime)
+        removed = 0
+        for key, paths in entries.items():
+            if newest[key] >= cutoff:
+                continue
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning("Cache prune failed %s -> %s", path, e)
+            removed += 1
+        return removed
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(max, base * 2**attempt))."""
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** attempt))
+
+
+def fetch(
+    session: requests.Session,
+    url: str,
+    limiter: HostRateLimiter | None = None,
+    cache: HttpCache | None = None,
+) -> str | None:
+    """
+    GET a page through the rate limiter and the cache. Connection errors, timeouts, 429 and 5xx
+    are retried up to RETRY_ATTEMPTS times with jittered exponential backoff (a Retry-After
+    header wins); other 4xx and request errors fail at once. Returns None if the page could not
+    be fetched, the reason is recorded per URL in metrics.
+    """
+    conditional = cache.conditional_headers(url) if cache else {}
+    reason = None
+    for attempt in range(RETRY_ATTEMPTS + 1):
+        if attempt:
+            metrics.inc("http_retries", reason=reason)
+        if limiter:
+            limiter.acquire(url)
+        started = time.monotonic()
+        try:
+            r = session.get(
+                url,
+                headers={"User-Agent": USER_AGENT, **conditional},
+                timeout=TIMEOUT,
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            reason = type(e).__name__
+            if limiter:
+                limiter.observe(url, time.monotonic() - started)
+            if attempt < RETRY_ATTEMPTS:
+                delay = backoff_delay(attempt)
+                logger.warning("GET %s -> %s, retry %d in %.1fs", url, e, attempt + 1, delay)
+                time.sleep(delay)
+            continue
+        except requests.RequestException as e:
+            reason = type(e).__name__
+            logger.warning("GET %s -> %s", url, e)
+            break
+        elapsed = time.monotonic() - started
+        metrics.observe("fetch", elapsed)
+        metrics.inc("http_responses", status=r.status_code)
+        if limiter:
+            limiter.observe(url, elapsed)
+        if r.status_code == 304 and cache:
+            body = cache.load_body(url)
+            if body is not None:
+                logger.info("GET 304 %s -> cached %d bytes", url, len(body))
+                metrics.inc("cache_hits", kind="http")
+                return body
+            reason = "cache_miss"
+            conditional = {}
+            continue
+        if r.status_code in RETRY_STATUSES:
+            reason = f"http_{r.status_code}"
+            if attempt < RETRY_ATTEMPTS:
+                delay = parse_retry_after(r.headers.get("Retry-After"))
+                if delay is not None:
+                    logger.warning("GET %s -> %d, retry after %.1fs", url, r.status_code, delay)
+                    if limiter:
+                        limiter.defer(url, delay)
+                    else:
+                        time.sleep(delay)
+                else:
+                    delay = backoff_delay(attempt)
+                    logger.warning("GET %s -> %d, retry %d in %.1fs", url, r.status_code, attempt + 1, delay)
+                    time.sleep(delay)
+            continue
+        if r.status_code >= 400:
+            reason = f"http_{r.status_code}"
+            break
+        body = r.text
+        logger.info("GET OK %s -> %d bytes", url, len(body))
+        if attempt:
+            metrics.inc("http_recovered")
+        if cache and body:
+            cache.store(url, r, body)
+        return body
+    logger.warning("GET FAIL %s -> %s after %d attempts", url, reason, attempt + 1)
+    metrics.inc("http_failures", reason=reason)
+    metrics.record_failure(url, reason, attempt + 1)
+    return None
+
+
+class CrawlCheckpoint:
+    """
+    Append-only JSON-lines journal of finished crawl units, so a run killed by the API timeout
+    or a network outage resumes where it stopped instead of refetching everything.
+    A category entry keeps its post links, a post entry its parsed table rows. Post rows are
+    read back lazily by file offset, so resuming does not hold the whole crawl in memory.
+    The caller removes the journal once the load is committed (discard()).
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str, max_age_hours: float = CHECKPOINT_MAX_AGE):
+        self.path = path
+        self.categories: dict[str, list[tuple[str, str | None, datetime | None]]] = {}
+        self._post_offsets: dict[str, int] = {}
+        self._writer = None
+        self._reader = None
+        self._load(max_age_hours)
+
+    @staticmethod
+    def fingerprint() -> str:
+        """Journals written for other sources, limits or parser versions are not reused."""
+        config = [SOURCES, REGION_IDS, MAX_POSTS_PER_CATEGORY, MIN_PUBLISH_YEAR, CrawlCheckpoint.VERSION, PARSE_VERSION]
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def _load(self, max_age_hours: float) -> None:
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            try:
+                header = json.loads(f.readline())
+                age = time.time() - header["created"]
+                usable = header.get("fingerprint") == self.fingerprint() and age < max_age_hours * 3600
+            except (ValueError, KeyError, TypeError):
+                usable = False
+            if not usable:
+                logger.info("Checkpoint %s is stale or from another config, starting over", self.path)
+            else:
+                offset = f.tell()
+                for line in iter(f.readline, b""):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # last line cut by a kill; it and anything after is redone
+                    if entry["kind"] == "category":
+                        self.categories[entry["url"]] = [
+                            (url, title, datetime.fromisoformat(published) if published else None)
+                            for url, title, published in entry["links"]
+                        ]
+                    elif entry["kind"] == "post":
+                        self._post_offsets[entry["url"]] = offset
+                    offset = f.tell()
+                # Drop a torn tail so new entries start on a clean line.
+                if offset < os.path.getsize(self.path):
+                    os.truncate(self.path, offset)
+        if not usable:
+            os.unlink(self.path)
+            return
+        logger.info(
+            "Checkpoint: resuming with %d categories, %d posts from %s",
+            len(self.categories), len(self._post_offsets), self.path,
+        )
+
+    def _append(self, entry: dict) -> int:
+        if self._writer is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._writer = open(self.path, "ab")
+            if self._writer.tell() == 0:
+                header = {"kind": "run", "version": self.VERSION, "fingerprint": self.fingerprint(), "created": time.time()}
+                self._writer.write(json.dumps(header).encode("utf-8") + b"\n")
+        offset = self._writer.tell()
+        self._writer.write(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._writer.flush()
+        return offset
+
+    def links(self, url: str) -> list[tuple[str, str | None, datetime | None]] | None:
+        return self.categories.get(url)
+
+    def category_done(self, url: str, links: list[tuple[str, str | None, datetime | None]]) -> None:
+        self.categories[url] = links
+        self._append({
+            "kind": "category",
+            "url": url,
+            "links": [(u, title, published.isoformat() if published else None) for u, title, published in links],
+        })
+
+    def has_post(self, url: str) -> bool:
+        return url in self._post_offsets
+
+    def post(self, url: str) -> tuple[list[dict], str | None] | None:
+        offset = self._post_offsets.get(url)
+        if offset is None:
+            return None
+        if self._writer:
+            self._writer.flush()
+        if self._reader is None:
+            self._reader = open(self.path, "rb")
+        self._reader.seek(offset)
+        entry = json.loads(self._reader.readline())
+        return entry["rows"], entry["region"]
+
+    def post_done(self, url: str, rows: list[dict], region: str | None) -> None:
+        self._post_offsets[url] = self._append({"kind": "post", "url": url, "region": region, "rows": rows})
+
+    def close(self) -> None:
+        for f in (self._writer, self._reader):
+            if f:
+                f.close()
+        self._writer = self._reader = None
+
+    def discard(self) -> None:
+        """Forget the journal after a committed load."""
+        self.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def resolve_html_backend(name: str) -> str:
+    """auto -> lxml when installed, else restricted BeautifulSoup."""
+    if name == "auto":
+        return "lxml" if lxml_html is not None else "bs4"
+    if name == "lxml" and lxml_html is None:
+        logger.warning("lxml is not installed, falling back to bs4 HTML backend")
+        return "bs4"
+    return name
+
+
+def _lxml_document(html: str):
+    """Document tree of a page, or None when it has no elements (empty or comment-only body)."""
+    try:
+        try:
+            return lxml_html.document_fromstring(html)
+        except ValueError:
+            # str with an XML encoding declaration
+            return lxml_html.document_fromstring(html.encode("utf-8"), parser=lxml_html.HTMLParser(encoding="utf-8"))
+    except lxml_html.etree.ParserError:
+        # "Document is empty": bs4 gives an empty soup here, not an error
         return None
 
 
-def parse_category_links(html: str, base_url: str, limit: int = 5) -> list[tuple[str, str | None, datetime | None]]:
+def _lxml_strings(el):
+    """Text nodes under el, skipping comments and script/style like bs4 get_text()."""
+    if el.text and el.tag not in _SKIP_TEXT_TAGS:
+        yield el.text
+    for child in el:
+        if isinstance(child.tag, str) and child.tag not in _SKIP_TEXT_TAGS:
+            yield from _lxml_strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def _lxml_text(el, strip: bool = False) -> str:
+    if len(el) == 0:
+        text = el.text or ""
+        return text.strip() if strip else text
+    if strip:
+        return "".join(s for s in (t.strip() for t in _lxml_strings(el)) if s)
+    return "".join(_lxml_strings(el))
+
+
+def _iter_post_anchors(html: str, backend: str):
+    """(href, text) for every <a href> in the page."""
+    if backend == "lxml":
+        doc = _lxml_document(html)
+        if doc is None:
+            return
+        for a in doc.iter("a"):
+            href = a.get("href")
+            if href is not None:
+                yield href, _lxml_text(a)
+        return
+    parse_only = None if backend == "bs4-full" else SoupStrainer("a", href=True)
+    soup = BeautifulSoup(html, "html.parser", parse_only=parse_only)
+    for a in soup.find_all("a", href=True):
+        yield a.get("href", ""), a.get_text()
+
+
+def parse_category_links(
+    html: str,
+    base_url: str,
+    limit: int = 5,
+    backend: str = "bs4-full",
+) -> list[tuple[str, str | None, datetime | None]]:
     """Return list of (post_url, title, published_date). Only posts with year >= MIN_PUBLISH_YEAR."""
     out = []
     try:
-        soup = BeautifulSoup(html, "html.parser")
-        for a in soup.find_all("a", href=True):
-            href = a.get("href", "")
+        for href, text in _iter_post_anchors(html, backend):
             if "/post/view/" not in href:
                 continue
             full_url = urljoin(base_url, href)
-            text = (a.get_text() or "").strip()
+            text = (text or "").strip()
             date_parsed = None
             if text:
-                m = re.match(r"(\d{1,2})\.(\d{1,2})\.(\d{4})\s*[-–—]", text)
+                m = POST_TITLE_DATE_RE.match(text)
                 if m:
                     try:
                         day, month, year = int(m.group(1)), int(m.group(2)), int(m.group(3))
@@ -111,62 +924,244 @@ def parse_category_links(html: str, base_url: str, limit: int = 5) -> list[tuple
     return out
 
 
+def row_from_cells(cells: list[str]) -> dict | None:
+    """Map the text cells of one <tr> to full_name, specialty?, region?, exam_date?, exam_time?"""
+    if not cells:
+        return None
+    first = cells[0]
+    if first.isdigit():
+        idx = 1
+    else:
+        idx = 0
+    if idx >= len(cells):
+        return None
+    full_name = cells[idx]
+    if not full_name or len(full_name) < 3:
+        return None
+    specialty = cells[idx + 1] if idx + 1 < len(cells) else None
+    region = None
+    exam_date = None
+    exam_time = None
+    if idx + 2 < len(cells):
+        maybe_region_or_date = cells[idx + 2]
+        if DATE_RE.match(maybe_region_or_date):
+            exam_date = maybe_region_or_date
+        else:
+            region = maybe_region_or_date
+    if idx + 3 < len(cells):
+        third = cells[idx + 3]
+        if DATE_RE.match(third):
+            exam_date = third
+        elif TIME_PREFIX_RE.match(third):
+            exam_time = third
+    if idx + 4 < len(cells):
+        fourth = cells[idx + 4]
+        if DATE_RE.match(fourth):
+            exam_date = fourth
+        elif TIME_PREFIX_RE.match(fourth):
+            exam_time = fourth
+    if idx + 5 < len(cells):
+        fifth = cells[idx + 5]
+        if TIME_PREFIX_RE.match(fifth):
+            exam_time = fifth
+    return {
+        "full_name": full_name,
+        "specialty": specialty or None,
+        "region": region or None,
+        "exam_date": exam_date or None,
+        "exam_time": exam_time or None,
+    }
+
+
+class TableSchema(NamedTuple):
+    """Column indexes of one table; None when the column is absent."""
+    width: int
+    name: int
+    specialty: int | None
+    region: int | None
+    date: int | None
+    time: int | None
+    source: str  # header | sampled
+
+
+def _header_column(cell: str) -> str | None:
+    text = cell.lower()
+    for column, keywords in HEADER_KEYWORDS:
+        if any(k in text for k in keywords):
+            return column
+    return None
+
+
+def _schema_from_header(cells: list[str], is_th: bool = True) -> TableSchema | None:
+    """
+    Schema from a header row. A <th> row only needs a name column; a <td> row must look like a
+    header rather than data (see _is_header_row), so a name like «Исмиров» is not mistaken for one.
+    """
+    if not is_th and not _is_header_row(cells):
+        return None
+    found: dict[str, int] = {}
+    for i, cell in enumerate(cells):
+        column = _header_column(cell)
+        if column == "datetime":
+            found.setdefault("date", i)
+            found.setdefault("time", i)
+        elif column:
+            found.setdefault(column, i)
+    if "name" not in found:
+        return None
+    return TableSchema(
+        len(cells), found["name"], found.get("specialty"), found.get("region"),
+        found.get("date"), found.get("time"), "header",
+    )
+
+
+def _is_header_row(cells: list[str]) -> bool:
+    """
+    A <td> row is a header only if no cell is data-shaped (date, time, row number)
+    and its cells name at least two distinct schema columns.
+    """
+    columns = set()
+    for cell in cells:
+        if DATE_RE.search(cell) or TIME_RE.search(cell) or cell.isdigit():
+            return False
+        column = _header_column(cell)
+        if column:
+            columns.add(column)
+    return len(columns) >= 2
+
+
+def _schema_from_sample(rows: list[list[str]]) -> TableSchema | None:
+    """Infer columns from the first data rows of the most common width."""
+    if not rows:
+        return None
+    widths: dict[int, int] = {}
+    for cells in rows:
+        widths[len(cells)] = widths.get(len(cells), 0) + 1
+    width = max(widths, key=widths.get)
+    sample = [cells for cells in rows if len(cells) == width][:SCHEMA_SAMPLE_ROWS]
+
+    def share(col: int, pattern: re.Pattern) -> float:
+        return sum(1 for cells in sample if pattern.search(cells[col])) / len(sample)
+
+    date_col = next((c for c in range(width) if share(c, DATE_RE) >= 0.6), None)
+    time_col = next((c for c in range(width) if share(c, TIME_RE) >= 0.6), None)
+    index_col = 0 if sum(1 for cells in sample if cells[0].isdigit()) / len(sample) >= 0.8 else None
+    text_cols = [c for c in range(width) if c not in (index_col, date_col, time_col)]
+    if not text_cols:
+        return None
+    return TableSchema(
+        width,
+        text_cols[0],
+        text_cols[1] if len(text_cols) > 1 else None,
+        text_cols[2] if len(text_cols) > 2 else None,
+        date_col,
+        time_col,
+        "sampled",
+    )
+
+
+def detect_table_schema(trs: list[tuple[list[str], bool]]) -> tuple[TableSchema | None, list[str] | None]:
+    """
+    Read the header row (th, or td cells that look like a header) among the first rows or,
+    failing that, sample the first data rows. Returns (schema, header cells).
+    """
+    for cells, is_th in trs[:HEADER_SCAN_ROWS]:
+        schema = _schema_from_header(cells, is_th)
+        if schema:
+            return schema, cells
+    data = [cells for cells, is_th in trs if not is_th and len(cells) >= 2]
+    return _schema_from_sample(data[:SCHEMA_SAMPLE_ROWS * 4]), None
+
+
+def rows_from_schema(trs: list[tuple[list[str], bool]], schema: TableSchema, header: list[str] | None) -> list[dict]:
+    """Direct-index extraction; rows that do not fit the schema go through row_from_cells."""
+    width, name_i, spec_i, region_i, date_i, time_i = schema[:6]
+    date_search = DATE_RE.search
+    time_search = TIME_RE.search
+    rows = []
+    for cells, is_th in trs:
+        # Строки выше заголовка не отбрасываем: пропускаются только th и строки-заголовки.
+        if is_th or len(cells) < 2 or cells == header or (header is not None and _is_header_row(cells)):
+            continue
+        if len(cells) != width:
+            row = row_from_cells(cells)
+            if row:
+                rows.append(row)
+            continue
+        full_name = cells[name_i]
+        if len(full_name) < 3:
+            continue
+        exam_date = exam_time = None
+        if date_i is not None:
+            m = date_search(cells[date_i])
+            exam_date = m.group(0) if m else None
+        if time_i is not None:
+            m = time_search(cells[time_i])
+            exam_time = m.group(0) if m else None
+        rows.append({
+            "full_name": full_name,
+            "specialty": (cells[spec_i] or None) if spec_i is not None else None,
+            "region": (cells[region_i] or None) if region_i is not None else None,
+            "exam_date": exam_date,
+            "exam_time": exam_time,
+        })
+    return rows
+
+
+def rows_from_table(trs: list[tuple[list[str], bool]]) -> list[dict]:
+    """
+    trs: (cell texts, is_th_row) for every <tr> of one table.
+    Detect the column schema once, then extract data rows by index.
+    """
+    started = time.perf_counter()
+    schema, header = detect_table_schema(trs)
+    if schema:
+        rows = rows_from_schema(trs, schema, header)
+    else:
+        rows = [row for row in (row_from_cells(cells) for cells, is_th in trs if not is_th) if row]
+    if rows:
+        logger.info(
+            "Table parsed: %d rows, schema=%s in %.1f ms",
+            len(rows), schema.source if schema else "legacy", (time.perf_counter() - started) * 1000,
+        )
+    return rows
+
+
 def parse_table_rows(soup: BeautifulSoup) -> list[dict]:
-    """Extract rows from first table(s). Each row: full_name, specialty?, region?, exam_date?, exam_time?"""
+    """Extract rows from all tables. Each row: full_name, specialty?, region?, exam_date?, exam_time?"""
     rows = []
     try:
         for table in soup.find_all("table"):
-            trs = table.find_all("tr")
-            for tr in trs:
+            trs = []
+            for tr in table.find_all("tr"):
                 tds = tr.find_all("td")
-                if len(tds) < 2:
-                    continue
-                cells = [td.get_text(strip=True) for td in tds]
-                if not cells:
-                    continue
-                first = cells[0]
-                if first.isdigit():
-                    idx = 1
-                else:
-                    idx = 0
-                if idx >= len(cells):
-                    continue
-                full_name = cells[idx]
-                if not full_name or len(full_name) < 3:
-                    continue
-                specialty = cells[idx + 1] if idx + 1 < len(cells) else None
-                region = None
-                exam_date = None
-                exam_time = None
-                if idx + 2 < len(cells):
-                    maybe_region_or_date = cells[idx + 2]
-                    if re.match(r"\d{1,2}\.\d{1,2}\.\d{4}", maybe_region_or_date):
-                        exam_date = maybe_region_or_date
-                    else:
-                        region = maybe_region_or_date
-                if idx + 3 < len(cells):
-                    third = cells[idx + 3]
-                    if re.match(r"\d{1,2}\.\d{1,2}\.\d{4}", third):
-                        exam_date = third
-                    elif re.match(r"\d{1,2}:\d{2}", third):
-                        exam_time = third
-                if idx + 4 < len(cells):
-                    fourth = cells[idx + 4]
-                    if re.match(r"\d{1,2}\.\d{1,2}\.\d{4}", fourth):
-                        exam_date = fourth
-                    elif re.match(r"\d{1,2}:\d{2}", fourth):
-                        exam_time = fourth
-                if idx + 5 < len(cells):
-                    fifth = cells[idx + 5]
-                    if re.match(r"\d{1,2}:\d{2}", fifth):
-                        exam_time = fifth
-                rows.append({
-                    "full_name": full_name,
-                    "specialty": specialty or None,
-                    "region": region or None,
-                    "exam_date": exam_date or None,
-                    "exam_time": exam_time or None,
-                })
+                if len(tds) >= 2:
+                    trs.append(([td.get_text(strip=True) for td in tds], False))
+                elif not tds:
+                    ths = tr.find_all("th")
+                    if len(ths) >= 2:
+                        trs.append(([th.get_text(strip=True) for th in ths], True))
+            rows.extend(rows_from_table(trs))
+    except Exception as e:
+        logger.exception("Parse table failed: %s", e)
+    return rows
+
+
+def parse_table_rows_lxml(doc) -> list[dict]:
+    """lxml fast path of parse_table_rows: same traversal, no BeautifulSoup tree."""
+    rows = []
+    try:
+        for table in doc.iter("table"):
+            trs = []
+            for tr in table.iter("tr"):
+                tds = list(tr.iter("td"))
+                if len(tds) >= 2:
+                    trs.append(([_lxml_text(td, strip=True) for td in tds], False))
+                elif not tds:
+                    ths = list(tr.iter("th"))
+                    if len(ths) >= 2:
+                        trs.append(([_lxml_text(th, strip=True) for th in ths], True))
+            rows.extend(rows_from_table(trs))
     except Exception as e:
         logger.exception("Parse table failed: %s", e)
     return rows
@@ -183,125 +1178,1204 @@ def extract_region_from_page(soup: BeautifulSoup) -> str | None:
     return None
 
 
-def main() -> None:
-    database_url = os.environ.get("DATABASE_URL")
-    if not database_url or not database_url.strip():
-        logger.error("DATABASE_URL is not set. Exit.")
-        raise SystemExit(1)
-
-    conn = None
+def extract_region_lxml(doc) -> str | None:
     try:
-        conn = psycopg2.connect(database_url)
-    except Exception as e:
-        logger.error("DB connect failed: %s", e)
-        raise SystemExit(1)
+        for h2 in doc.iter("h2"):
+            return _lxml_text(h2, strip=True)[:500] or None
+    except Exception:
+        pass
+    return None
 
-    session = requests.Session()
-    all_rows = []
 
+def parse_post(html: str, backend: str = "bs4-full") -> tuple[list[dict], str | None]:
+    """Parse a post page into (table rows, page region) with the given HTML backend."""
+    if backend == "lxml":
+        try:
+            doc = _lxml_document(html)
+        except Exception as e:
+            logger.exception("Parse table failed: %s", e)
+            return [], None
+        if doc is None:
+            return [], None
+        return parse_table_rows_lxml(doc), extract_region_lxml(doc)
+    # bs4 и bs4-full: SoupStrainer(["table", "h2"]) на страницах постов не быстрее полного разбора
+    # (таблица — почти весь документ), поэтому посты всегда разбираются целиком.
+    soup = BeautifulSoup(html, "html.parser")
+    return parse_table_rows(soup), extract_region_from_page(soup)
+
+
+def check_backend_parity(paths: list[str]) -> bool:
+    """
+    Parse saved category/post pages with every available backend and compare
+    against the reference bs4-full output. Returns True when all match.
+    """
+    backends = [b for b in HTML_BACKENDS if b != "bs4-full" and (b != "lxml" or lxml_html is not None)]
+    ok = True
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        base_url = "https://tmbm.ssv.uz/"
+        ref_links = parse_category_links(html, base_url, limit=10**9)
+        ref_post = parse_post(html)
+        for backend in backends:
+            links = parse_category_links(html, base_url, limit=10**9, backend=backend)
+            post = parse_post(html, backend)
+            if links != ref_links or post != ref_post:
+                ok = False
+                logger.error("Parity MISMATCH %s backend=%s", path, backend)
+                for name, got, ref in (("rows", post[0], ref_post[0]), ("links", links, ref_links)):
+                    diff = next(((i, a, b) for i, (a, b) in enumerate(zip(got, ref)) if a != b), None)
+                    if diff or len(got) != len(ref):
+                        logger.error("  %s: %d vs %d, first diff: %s", name, len(got), len(ref), diff)
+                if post[1] != ref_post[1]:
+                    logger.error("  region: %r vs %r", post[1], ref_post[1])
+            else:
+                logger.info("Parity OK %s backend=%s rows=%d links=%d", path, backend, len(post[0]), len(links))
+    return ok
+
+
+def iter_category_units() -> list[tuple[dict, int | None, str]]:
+    """(source, region_id, category_url) for every category page to crawl, in crawl order."""
+    units = []
     for source in SOURCES:
         url = source["url"]
-        stage = source["stage"]
-        profession = source["profession"]
-        by_region = source.get("by_region", False)
-        urls_to_fetch = [url_with_region(url, rid) for rid in REGION_IDS] if by_region else [url]
-
-        for idx, cat_url in enumerate(urls_to_fetch):
-            region_id = REGION_IDS[idx] if by_region else None
-            region_label = f" l={region_id}" if region_id is not None else ""
-            logger.info("Category: %s stage=%s profession=%s%s", cat_url, stage, profession, region_label)
-
-            html = fetch(session, cat_url)
-            if not html:
-                logger.warning("Category skipped (no content): %s", cat_url)
-                continue
-            time.sleep(SLEEP_BETWEEN_REQUESTS)
+        if source.get("by_region", False):
+            units.extend((source, rid, url_with_region(url, rid)) for rid in REGION_IDS)
+        else:
+            units.append((source, None, url))
+    return units
 
-            links = parse_category_links(html, cat_url, limit=MAX_POSTS_PER_CATEGORY)
-            if not links:
-                logger.info("Category %s: 0 post links (empty or all before %d)", cat_url, MIN_PUBLISH_YEAR)
-                if by_region:
-                    continue
+
+class AttestationRow(NamedTuple):
+    """One load-ready attestation_people row (without id)."""
+    full_name: str
+    full_name_normalized: str
+    name_key: str
+    full_name_search: str
+    name_tokens: list[str]
+    specialty: str | None
+    region: str | None
+    stage: int
+    profession: str
+    exam_date: date | None
+    exam_time: dt_time | None
+    source_url: str
+    source_urls: list[str]
+    published_date: date | None
+
+
+def wait_done(future: Future) -> None:
+    """
+    Block until future is finished or cancelled. Not concurrent.futures.wait(): a future cancelled
+    by ProcessPoolExecutor.shutdown(cancel_futures=True) never wakes wait(), only result()/exception().
+    """
+    try:
+        future.exception()
+    except CancelledError:
+        pass
+
+
+def bounded_map(submit, items, window: int):
+    """
+    Like pool.map, but pulls `items` lazily and keeps at most `window` tasks in flight.
+    submit(item) returns a Future. Yields (item, future) in input order once each future is done.
+    """
+    pending = deque()
+    for item in items:
+        pending.append((item, submit(item)))
+        if len(pending) >= window:
+            item, future = pending.popleft()
+            wait_done(future)
+            yield item, future
+    while pending:
+        item, future = pending.popleft()
+        wait_done(future)
+        yield item, future
+
+
+def completed_future(fn, *args) -> Future:
+    """Run fn inline and wrap the outcome in a finished Future."""
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def parse_exam_date(text: str | None) -> date | None:
+    """"dd.mm.yyyy" cell -> date; None when the cell is empty or not a real calendar date."""
+    m = EXAM_DATE_RE.search(text) if text else None
+    if not m:
+        return None
+    try:
+        return date(int(m.group(3)), int(m.group(2)), int(m.group(1)))
+    except ValueError:
+        return None
+
+
+def parse_exam_time(text: str | None) -> dt_time | None:
+    """First "HH:MM" of a cell (ranges like "09:00-12:00" keep the start) -> time, or None."""
+    m = EXAM_TIME_RE.search(text) if text else None
+    if not m:
+        return None
+    try:
+        return dt_time(int(m.group(1)), int(m.group(2)))
+    except ValueError:
+        return None
+
+
+def normalize_rows(
+    table_rows: list[dict],
+    source: dict,
+    post_url: str,
+    published_date: datetime | None,
+    page_region: str | None,
+):
+    """
+    Parsed row dicts of one post -> AttestationRow tuples; rows without a usable name are dropped.
+    Date/time cells that are present but do not parse are loaded as NULL and counted in invalid_cells.
+    """
+    pub_date = published_date.date() if published_date else None
+    label = source_label(source)
+    for row in table_rows:
+        full_name = row.get("full_name")
+        normalized = normalize_name(full_name) if full_name else ""
+        if not normalized:
+            continue
+        raw_date, raw_time = row.get("exam_date"), row.get("exam_time")
+        exam_date, exam_time = parse_exam_date(raw_date), parse_exam_time(raw_time)
+        if raw_date and exam_date is None:
+            metrics.inc("invalid_cells", column="exam_date", source=label)
+            logger.debug("Unparseable exam date %r in %s", raw_date, post_url)
+        if raw_time and exam_time is None:
+            metrics.inc("invalid_cells", column="exam_time", source=label)
+            logger.debug("Unparseable exam time %r in %s", raw_time, post_url)
+        yield AttestationRow(
+            full_name,
+            normalized,
+            name_key(full_name),
+            *search_keys(normalized),
+            row.get("specialty"),
+            row.get("region") or page_region,
+            source["stage"],
+            source["profession"],
+            exam_date,
+            exam_time,
+            post_url,
+            [post_url],
+            pub_date,
+        )
+
+
+def parse_post_job(html: str, backend: str, digest: str) -> tuple[list[dict], str | None, str, float | None]:
+    """Process-pool entry point: (rows, page region, body digest, parse seconds; None = from cache)."""
+    started = time.perf_counter()
+    rows, region = parse_post(html, backend)
+    return rows, region, digest, time.perf_counter() - started
+
+
+def source_label(source: dict) -> str:
+    """Metrics label of a source: last path segment of its category URL."""
+    return urlparse(source["url"]).path.rstrip("/").rsplit("/", 1)[-1]
+
+
+def crawl_rows(
+    session: requests.Session,
+    limiter: HostRateLimiter,
+    concurrency: int,
+    cache: HttpCache | None = None,
+    backend: str = "bs4-full",
+    failed_urls: list[str] | None = None,
+    workers: int = 0,
+    checkpoint: CrawlCheckpoint | None = None,
+    skip_post=None,
+):
+    """
+    Stream AttestationRow tuples: fetch category pages -> fetch post pages -> parse -> normalize.
+    Every stage is lazy with at most FETCH_WINDOW_FACTOR * concurrency pages in flight, so memory
+    does not grow with the number of posts. With workers > 1 post HTML is parsed in a process pool;
+    results are still consumed in input order, so output matches the old serial loop. If a pool
+    process dies, its posts and the rest of the run are parsed in-process instead.
+    URLs that could not be fetched or parsed are appended to `failed_urls`. After a complete crawl
+    cache entries unused for CACHE_MAX_AGE_DAYS are pruned.
+    Units already in `checkpoint` are replayed from it without network or parsing; newly finished
+    ones are journaled there. Posts for which skip_post(post_url) is true are not fetched at all.
+    """
+    if failed_urls is None:
+        failed_urls = []
+    window = max(concurrency, 1) * FETCH_WINDOW_FACTOR
+    parse_pool = None
+    if workers > 1:
+        parse_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        window = max(window, workers * FETCH_WINDOW_FACTOR)
+    # HTML и digest постов, отданных в пул: если дочерний процесс умрёт, пост разбирается здесь.
+    pool_jobs: dict[Future, tuple[str, str, str]] = {}
+
+    def parse_pool_broken(e: Exception) -> None:
+        nonlocal parse_pool
+        if parse_pool is None:
+            return
+        logger.error("Parse worker died (%s), parsing the rest of the run in-process", e)
+        metrics.inc("parse_pool_broken")
+        parse_pool.shutdown(wait=False, cancel_futures=True)
+        parse_pool = None
+
+    def parse_result(future: Future):
+        job = pool_jobs.pop(future, None)
+        try:
+            return future.result()
+        except (BrokenProcessPool, CancelledError) as e:
+            # после shutdown(cancel_futures=True) ещё не начатые задания отменены, а не сломаны
+            if job is None:
+                raise
+            parse_pool_broken(e)
+            return parse_post_job(*job)
+
+    def page_fetched(kind, source, region_id, html):
+        labels = {"source": source_label(source), "region": region_id if region_id is not None else "all"}
+        if html:
+            metrics.inc("pages", kind=kind, **labels)
+            metrics.inc("bytes", len(html.encode("utf-8")), kind=kind, **labels)
+        else:
+            metrics.inc("failed_pages", kind=kind, **labels)
+
+    def submit_fetch(url):
+        if checkpoint and (checkpoint.links(url) is not None or checkpoint.has_post(url)):
+            return completed_future(lambda: None)
+        return pool.submit(fetch, session, url, limiter, cache)
+
+    def submit_parse(fetched):
+        (source, region_id, post_url, _published_date), fetch_future = fetched
+        saved = checkpoint.post(post_url) if checkpoint else None
+        if saved is not None:
+            metrics.inc("checkpoint_hits", kind="post")
+            return completed_future(lambda: (*saved, None, None))
+        post_html = fetch_future.result()
+        page_fetched("post", source, region_id, post_html)
+        if not post_html:
+            return completed_future(lambda: None)
+        digest = content_digest(post_html)
+        cached = cache.load_parsed(post_url, digest) if cache else None
+        if cached is not None:
+            logger.info("Post unchanged %s, parse skipped", post_url)
+            metrics.inc("cache_hits", kind="parse")
+            return completed_future(lambda: (*cached, digest, None))
+        if parse_pool:
+            try:
+                future = parse_pool.submit(parse_post_job, post_html, backend, digest)
+            except BrokenProcessPool as e:
+                parse_pool_broken(e)
             else:
+                pool_jobs[future] = (post_html, backend, digest)
+                return future
+        return completed_future(parse_post_job, post_html, backend, digest)
+
+    pool = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+    try:
+        category_pages = bounded_map(lambda unit: submit_fetch(unit[2]), iter_category_units(), window)
+
+        def iter_posts():
+            for (source, region_id, cat_url), future in category_pages:
+                region_label = f" l={region_id}" if region_id is not None else ""
+                logger.info(
+                    "Category: %s stage=%s profession=%s%s",
+                    cat_url, source["stage"], source["profession"], region_label,
+                )
+                links = checkpoint.links(cat_url) if checkpoint else None
+                if links is not None:
+                    metrics.inc("checkpoint_hits", kind="category")
+                else:
+                    html = future.result()
+                    page_fetched("category", source, region_id, html)
+                    if not html:
+                        logger.warning("Category skipped (no content): %s", cat_url)
+                        failed_urls.append(cat_url)
+                        continue
+                    links = parse_category_links(html, cat_url, limit=MAX_POSTS_PER_CATEGORY, backend=backend)
+                    if checkpoint:
+                        checkpoint.category_done(cat_url, links)
+                if not links:
+                    logger.info("Category %s: 0 post links (empty or all before %d)", cat_url, MIN_PUBLISH_YEAR)
+                    continue
                 logger.info("Category %s: found %d post links", cat_url, len(links))
+                for post_url, _title, published_date in links:
+                    if skip_post and skip_post(post_url):
+                        continue
+                    yield source, region_id, post_url, published_date
+
+        post_pages = bounded_map(lambda post: submit_fetch(post[2]), iter_posts(), window)
+        parsed_posts = bounded_map(submit_parse, post_pages, window)
 
-            for post_url, _title, published_date in links:
-                time.sleep(SLEEP_BETWEEN_REQUESTS)
-                post_html = fetch(session, post_url)
-                if not post_html:
+        for ((source, region_id, post_url, published_date), _fetch_future), future in parsed_posts:
+            try:
+                parsed = parse_result(future)
+                if parsed is None:
                     logger.warning("Post skipped (no content): %s", post_url)
+                    failed_urls.append(post_url)
                     continue
-                try:
-                    post_soup = BeautifulSoup(post_html, "html.parser")
-                    page_region = extract_region_from_page(post_soup)
-                    table_rows = parse_table_rows(post_soup)
-                    for row in table_rows:
-                        if not row.get("full_name"):
-                            continue
-                        if not row.get("region") and page_region:
-                            row["region"] = page_region
-                        row["stage"] = stage
-                        row["profession"] = profession
-                        row["source_url"] = post_url
-                        row["published_date"] = published_date
-                        all_rows.append(row)
-                    logger.info("Post OK %s -> %d rows", post_url, len(table_rows))
-                except Exception as e:
-                    logger.warning("Post FAIL %s -> %s", post_url, e)
-
-    logger.info("Total rows to insert: %d", len(all_rows))
-
-    if not all_rows:
-        logger.warning("No rows to insert.")
-        conn.close()
-        return
+                table_rows, page_region, digest, parse_seconds = parsed
+                if parse_seconds is not None:
+                    metrics.observe("parse", parse_seconds)
+                    if cache:
+                        cache.store_parsed(post_url, digest, table_rows, page_region)
+                if checkpoint and not checkpoint.has_post(post_url):
+                    checkpoint.post_done(post_url, table_rows, page_region)
+                started = time.perf_counter()
+                rows = list(normalize_rows(table_rows, source, post_url, published_date, page_region))
+                metrics.observe("normalize", time.perf_counter() - started)
+                logger.info("Post OK %s -> %d rows", post_url, len(table_rows))
+            except Exception as e:
+                logger.warning("Post FAIL %s -> %s", post_url, e)
+                metrics.inc("failed_pages", kind="parse", source=source_label(source))
+                metrics.record_failure(post_url, f"parse: {e}", 1)
+                failed_urls.append(post_url)
+                continue
+            metrics.inc(
+                "rows", len(rows),
+                source=source_label(source), region=region_id if region_id is not None else "all",
+            )
+            yield from rows
+        if cache and CACHE_MAX_AGE_DAYS > 0:
+            removed = cache.prune(CACHE_MAX_AGE_DAYS)
+            if removed:
+                logger.info("Cache: removed %d entries unused for %g days", removed, CACHE_MAX_AGE_DAYS)
+                metrics.inc("cache_pruned", removed)
+    finally:
+        # On early exit (SIGTERM, DB error) do not wait for queued fetches.
+        pool.shutdown(cancel_futures=True)
+        if parse_pool:
+            parse_pool.shutdown(cancel_futures=True)
+
+
+INSERT_COLUMNS = ("id",) + AttestationRow._fields
+
+# Естественный ключ строки: один человек (имя, специальность, этап, профессия, дата экзамена)
+# независимо от поста и региона; все посты, где он встречается, — в source_urls.
+NATURAL_KEY_COLUMNS = ("full_name_normalized", "specialty", "stage", "profession", "exam_date")
+NATURAL_KEY_MATCH = """
+    s.full_name_normalized = p.full_name_normalized
+    AND s.specialty IS NOT DISTINCT FROM p.specialty
+    AND s.stage = p.stage
+    AND s.profession = p.profession
+    AND s.exam_date IS NOT DISTINCT FROM p.exam_date
+"""
+# Остальные колонки существующего человека обновляются из прогона (пост поправили на месте,
+# человека переопубликовали с другим временем) — как после полной загрузки.
+UPDATE_COLUMNS = tuple(
+    c for c in AttestationRow._fields if c not in NATURAL_KEY_COLUMNS and c not in ("source_url", "source_urls")
+)
+UPDATE_SET = ", ".join(f"{c} = s.{c}" for c in UPDATE_COLUMNS)
+UPDATE_CHANGED = (
+    f"({', '.join(f'p.{c}' for c in UPDATE_COLUMNS)}) IS DISTINCT FROM ({', '.join(f's.{c}' for c in UPDATE_COLUMNS)})"
+)
+# Добавить к p.source_urls адреса из s.source_urls, которых там ещё нет (порядок сохраняется).
+MERGE_SOURCE_URLS = "p.source_urls || ARRAY(SELECT u FROM unnest(s.source_urls) AS u WHERE u <> ALL(p.source_urls))"
+
+
+# Индексы поиска (как в миграции add_attestation_search_keys): триграммы для contains/ILIKE и GIN по словам.
+SEARCH_INDEXES = {
+    "idx_attestation_name_trgm":
+        'CREATE INDEX "idx_attestation_name_trgm" ON attestation_people USING GIN (full_name_normalized gin_trgm_ops)',
+    "idx_attestation_tokens": 'CREATE INDEX "idx_attestation_tokens" ON attestation_people USING GIN (name_tokens)',
+    "idx_attestation_search": 'CREATE INDEX "idx_attestation_search" ON attestation_people (full_name_search)',
+    "idx_attestation_name_key": 'CREATE INDEX "idx_attestation_name_key" ON attestation_people (name_key)',
+    "idx_attestation_name_key_trgm":
+        'CREATE INDEX "idx_attestation_name_key_trgm" ON attestation_people USING GIN (name_key gin_trgm_ops)',
+}
+
 
+def ensure_search_indexes(cur) -> None:
+    """
+    Create pg_trgm and the search indexes if they are missing (e.g. the table was restored
+    without them). Existing indexes are only looked up, so a normal run takes no extra locks.
+    A missing privilege for CREATE EXTENSION is logged, not fatal: search just stays unindexed.
+    """
+    cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'attestation_people'")
+    existing = {r[0] for r in cur.fetchall()}
+    missing = [name for name in SEARCH_INDEXES if name not in existing]
+    if not missing:
+        return
+    cur.execute("SAVEPOINT search_indexes")
     try:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM attestation_people")
-            deleted = cur.rowcount
-            logger.info("Deleted %d existing rows", deleted)
-
-            def gen():
-                for r in all_rows:
-                    normalized = normalize_name(r["full_name"])
-                    if not normalized:
-                        continue
-                    pub_ts = r.get("published_date")
-                    pub_date = pub_ts.date() if pub_ts else None
-                    yield (
-                        str(uuid.uuid4()),
-                        r["full_name"],
-                        normalized,
-                        r.get("specialty"),
-                        r.get("region"),
-                        r["stage"],
-                        r["profession"],
-                        r.get("exam_date"),
-                        r.get("exam_time"),
-                        r["source_url"],
-                        pub_date,
-                    )
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name in missing:
+            started = time.monotonic()
+            cur.execute(SEARCH_INDEXES[name])
+            logger.info("Created index %s in %.2fs", name, time.monotonic() - started)
+        cur.execute("RELEASE SAVEPOINT search_indexes")
+    except psycopg2.Error as e:
+        cur.execute("ROLLBACK TO SAVEPOINT search_indexes")
+        logger.warning("Search indexes not created (%s): %s", ", ".join(missing), e)
+
+
+def backfill_name_keys(cur) -> int:
+    """
+    Fill name_key for rows loaded before the column existed: incremental runs never rewrite
+    unchanged rows, and the key is computed only here (and in normalize.ts), not in SQL.
+    """
+    cur.execute("SELECT id, full_name FROM attestation_people WHERE name_key IS NULL")
+    keys = [(row_id, name_key(full_name)) for row_id, full_name in cur.fetchall()]
+    for start in range(0, len(keys), LOAD_BATCH_SIZE):
+        execute_values(
+            cur,
+            "UPDATE attestation_people p SET name_key = v.name_key FROM (VALUES %s) AS v(id, name_key) WHERE p.id = v.id",
+            keys[start:start + LOAD_BATCH_SIZE],
+            page_size=LOAD_BATCH_SIZE,
+        )
+    if keys:
+        logger.info("Backfilled name_key for %d rows", len(keys))
+    return len(keys)
+
+
+def dedup_key(row: AttestationRow) -> bytes:
+    """16-byte digest of NATURAL_KEY_COLUMNS: the seen-set holds these instead of the rows."""
+    parts = (
+        row.full_name_normalized,
+        row.specialty or "",
+        str(row.stage),
+        row.profession,
+        row.exam_date.isoformat() if row.exam_date else "",
+    )
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).digest()
+
+
+class RowDeduper:
+    """
+    Drop repeated persons from a row stream (region pages overlap the category page, daily
+    re-publications repeat names): only the first row of each dedup_key is passed on.
+    The stream stays lazy: memory is one digest per person plus, for persons seen more than
+    once, their key and the extra post URLs, which apply() adds to source_urls after the load.
+    """
 
+    def __init__(self):
+        self.seen: set[bytes] = set()
+        self.extra: dict[bytes, tuple[tuple, list[str]]] = {}
+        self.repeated = 0
+
+    def __call__(self, rows):
+        for row in rows:
+            digest = dedup_key(row)
+            if digest not in self.seen:
+                self.seen.add(digest)
+                yield row
+                continue
+            self.repeated += 1
+            key, urls = self.extra.setdefault(
+                digest,
+                ((row.full_name_normalized, row.specialty, row.stage, row.profession, row.exam_date), []),
+            )
+            if row.source_url not in urls:
+                urls.append(row.source_url)
+
+    def apply(self, cur, table: str) -> None:
+        """Append the URLs of repeated rows to the loaded (first) row of each person in `table`."""
+        if self.repeated:
+            metrics.inc("rows_deduplicated", self.repeated)
+            logger.info("Dedup: %d repeated rows merged into %d persons", self.repeated, len(self.extra))
+        values = [(*key, urls) for key, urls in self.extra.values()]
+        for start in range(0, len(values), LOAD_BATCH_SIZE):
             execute_values(
                 cur,
-                """
-                INSERT INTO attestation_people (
-                    id, full_name, full_name_normalized, specialty, region, stage, profession,
-                    exam_date, exam_time, source_url, published_date
-                ) VALUES %s
+                f"""
+                UPDATE {table} p SET source_urls = {MERGE_SOURCE_URLS}
+                FROM (VALUES %s) AS s({", ".join(NATURAL_KEY_COLUMNS)}, source_urls)
+                WHERE {NATURAL_KEY_MATCH}
                 """,
-                list(gen()),
-                template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                values[start:start + LOAD_BATCH_SIZE],
+                template="(%s, %s, %s::int, %s, %s::date, %s::text[])",
+                page_size=LOAD_BATCH_SIZE,
             )
+
+
+def row_values(rows):
+    """Yield INSERT tuples (INSERT_COLUMNS order) with a fresh id for each AttestationRow."""
+    for r in rows:
+        yield (str(uuid.uuid4()), *r)
+
+
+def array_literal(items: list[str]) -> str:
+    """Postgres text[] literal: every element double-quoted, so commas and braces need no special care."""
+    return "{" + ",".join('"' + item.replace("\\", "\\\\").replace('"', '\\"') + '"' for item in items) + "}"
+
+
+def copy_field(value) -> str:
+    """Encode one value for COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, list):
+        value = array_literal(value)
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class CopyStream:
+    """
+    Read-only file object over an iterator of tuples, encoded as COPY text lines.
+    copy_expert pulls it chunk by chunk, so at most ~one buffer of rows is held in memory.
+    The time between two reads is the server consuming a chunk: it goes to the "load" stage,
+    while producing rows (the upstream crawl) is not counted.
+    """
+
+    def __init__(self, values, buffer_size: int = COPY_BUFFER_SIZE):
+        self._values = iter(values)
+        self._buffer_size = buffer_size
+        self._pending = ""
+        self._returned_at: float | None = None
+        self.rows = 0
+
+    def chunk_sent(self) -> None:
+        """Record the server time of the last chunk handed to copy_expert."""
+        if self._returned_at is not None:
+            metrics.observe("load", time.perf_counter() - self._returned_at)
+            self._returned_at = None
+
+    def read(self, size: int = -1) -> str:
+        self.chunk_sent()
+        limit = size if size and size > 0 else self._buffer_size
+        parts = [self._pending]
+        length = len(self._pending)
+        for value in self._values:
+            line = "\t".join(copy_field(v) for v in value) + "\n"
+            parts.append(line)
+            length += len(line)
+            self.rows += 1
+            if length >= limit:
+                break
+        data = "".join(parts)
+        self._pending = data[limit:]
+        self._returned_at = time.perf_counter()
+        return data[:limit]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def insert_rows(cur, table: str, rows, loader: str = LOADER) -> int:
+    """Stream an iterable of AttestationRow into `table`; returns the number of rows loaded."""
+    started = time.monotonic()
+    columns = ", ".join(INSERT_COLUMNS)
+    if loader == "copy":
+        stream = CopyStream(row_values(rows))
+        cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN", stream, size=COPY_BUFFER_SIZE)
+        stream.chunk_sent()
+        count = stream.rows
+    else:
+        count = 0
+        values = row_values(rows)
+        while batch := list(islice(values, LOAD_BATCH_SIZE)):
+            batch_started = time.perf_counter()
+            execute_values(
+                cur,
+                f"INSERT INTO {table} ({columns}) VALUES %s",
+                batch,
+                template="(" + ", ".join(["%s"] * len(INSERT_COLUMNS)) + ")",
+                page_size=len(batch),
+            )
+            metrics.observe("load", time.perf_counter() - batch_started)
+            count += len(batch)
+    metrics.inc("rows_loaded", count, table=table, loader=loader)
+    logger.info(
+        "Loaded %d rows into %s via %s in %.2fs (peak RSS %.1f MB)",
+        count, table, loader, time.monotonic() - started, peak_rss_mb(),
+    )
+    return count
+
+
+def write_rows_replace(cur, rows, loader: str = LOADER) -> int:
+    """DELETE everything and insert the (deduplicated) crawl as-is."""
+    started = time.perf_counter()
+    cur.execute("DELETE FROM attestation_people")
+    metrics.observe("apply", time.perf_counter() - started)
+    metrics.inc("rows_applied", cur.rowcount, op="delete")
+    logger.info("Deleted %d existing rows", cur.rowcount)
+    dedup = RowDeduper()
+    count = insert_rows(cur, "attestation_people", dedup(rows), loader)
+    dedup.apply(cur, "attestation_people")
+    return count
+
+
+def write_rows_incremental(
+    cur, rows, failed_urls: list[str] | None = None, loader: str = LOADER, delete_missing: bool = True,
+) -> int:
+    """
+    Load the deduplicated crawl into a temp staging table and apply only the difference keyed
+    on NATURAL_KEY_COLUMNS. Runs inside the caller's transaction, so readers keep seeing
+    the previous table until commit and unchanged rows are never rewritten.
+    `failed_urls` is checked after `rows` is exhausted: any failure turns deletions off.
+    delete_missing=False only inserts (watch mode, where `rows` is a partial crawl).
+    source_urls of existing persons are replaced by a complete crawl and only extended by a
+    partial one (failed pages or delete_missing=False); their other columns (UPDATE_COLUMNS)
+    take the crawled values either way.
+    """
+    cur.execute(
+        "CREATE TEMP TABLE attestation_people_staging "
+        "(LIKE attestation_people INCLUDING DEFAULTS) ON COMMIT DROP"
+    )
+    dedup = RowDeduper()
+    count = insert_rows(cur, "attestation_people_staging", dedup(rows), loader)
+    if not count:
+        return 0
+    dedup.apply(cur, "attestation_people_staging")
+    started = time.perf_counter()
+    cur.execute("ANALYZE attestation_people_staging")
+
+    deleted = 0
+    complete = delete_missing and not failed_urls
+    if delete_missing and failed_urls:
+        logger.warning("%d pages failed, keeping rows that are missing from this crawl", len(failed_urls))
+    elif delete_missing:
+        cur.execute(f"""
+            DELETE FROM attestation_people p
+            WHERE NOT EXISTS (SELECT 1 FROM attestation_people_staging s WHERE {NATURAL_KEY_MATCH})
+        """)
+        deleted = cur.rowcount
+
+    if complete:
+        cur.execute(f"""
+            UPDATE attestation_people p SET
+                source_url = CASE WHEN p.source_url = ANY(s.source_urls) THEN p.source_url ELSE s.source_url END,
+                source_urls = s.source_urls,
+                {UPDATE_SET}
+            FROM attestation_people_staging s
+            WHERE {NATURAL_KEY_MATCH}
+                AND (NOT (p.source_urls @> s.source_urls AND p.source_urls <@ s.source_urls) OR {UPDATE_CHANGED})
+        """)
+    else:
+        cur.execute(f"""
+            UPDATE attestation_people p SET source_urls = {MERGE_SOURCE_URLS}, {UPDATE_SET}
+            FROM attestation_people_staging s
+            WHERE {NATURAL_KEY_MATCH} AND (NOT s.source_urls <@ p.source_urls OR {UPDATE_CHANGED})
+        """)
+    updated = cur.rowcount
+
+    columns = ", ".join(INSERT_COLUMNS)
+    key = ", ".join(f"s.{c}" for c in NATURAL_KEY_COLUMNS)
+    cur.execute(f"""
+        INSERT INTO attestation_people ({columns})
+        SELECT DISTINCT ON ({key}) {", ".join(f"s.{c}" for c in INSERT_COLUMNS)}
+        FROM attestation_people_staging s
+        WHERE NOT EXISTS (SELECT 1 FROM attestation_people p WHERE {NATURAL_KEY_MATCH})
+        ORDER BY {key}
+    """)
+    metrics.observe("apply", time.perf_counter() - started)
+    metrics.inc("rows_applied", cur.rowcount, op="insert")
+    metrics.inc("rows_applied", updated, op="update")
+    metrics.inc("rows_applied", deleted, op="delete")
+    logger.info("Incremental load: %d inserted, %d updated, %d deleted", cur.rowcount, updated, deleted)
+    return count
+
+
+def name_trigrams(key: str) -> set[str]:
+    """pg_trgm-style trigrams of a name key: every word padded with two spaces in front and one behind."""
+    trigrams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def trigram_code(trigram: str) -> int:
+    """The three ASCII bytes of a name-key trigram as one sortable uint32."""
+    return int.from_bytes(trigram.encode("ascii"), "big")
+
+
+def snapshot_value(value):
+    """JSON-safe snapshot cell: dates as ISO strings, times as HH:MM (the API format)."""
+    if isinstance(value, dt_time):
+        return value.strftime("%H:%M")
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def write_snapshot(conn, path: str, table: str = "attestation_people") -> int:
+    """
+    Write the lookup snapshot read by attestation_lookup.py and return its row count.
+    Layout after SNAPSHOT_HEADER, uint32 arrays in host (little-endian) order:
+    key offsets (k+1), first row of each key (k+1), row offsets (n+1), sorted trigram codes (t),
+    posting offsets (t+1), postings (key numbers, ascending), then the distinct name_key bytes
+    and the JSON row payloads. Rows are sorted by name_key bytes, so prefix search is a binary
+    search and the rows of one key are contiguous; postings index keys, not rows, because the
+    same person is listed on many posts.
+    Rows stream from a named cursor and payloads are spooled to a temp file: memory holds only
+    keys and postings. The file is swapped in with os.replace, so open readers keep the old one.
+    """
+    started = time.perf_counter()
+    directory = os.path.dirname(os.path.abspath(path))
+    key_offsets = array("I", [0])
+    key_rows = array("I", [0])
+    row_offsets = array("I", [0])
+    keys = bytearray()
+    postings: dict[int, array] = {}
+    with tempfile.TemporaryFile(dir=directory) as payloads:
+        with conn.cursor(name="attestation_snapshot") as cur:
+            cur.itersize = LOAD_BATCH_SIZE
+            cur.execute(f"""
+                SELECT name_key, {", ".join(SNAPSHOT_FIELDS)} FROM {table}
+                WHERE name_key <> ''
+                ORDER BY name_key COLLATE "C", published_date DESC NULLS LAST, exam_date DESC NULLS LAST
+            """)
+            last_key = None
+            for key, *values in cur:
+                if key != last_key:
+                    if last_key is not None:
+                        key_rows.append(len(row_offsets) - 1)
+                    for trigram in name_trigrams(key):
+                        postings.setdefault(trigram_code(trigram), array("I")).append(len(key_offsets) - 1)
+                    keys += key.encode("ascii")
+                    key_offsets.append(len(keys))
+                    last_key = key
+                payloads.write(json.dumps(
+                    [snapshot_value(v) for v in values], ensure_ascii=False, separators=(",", ":"),
+                ).encode("utf-8"))
+                row_offsets.append(payloads.tell())
+            if last_key is not None:
+                key_rows.append(len(row_offsets) - 1)
+        rows = len(row_offsets) - 1
+        codes = sorted(postings)
+        posting_offsets = array("I", accumulate((len(postings[c]) for c in codes), initial=0))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(SNAPSHOT_HEADER.pack(
+                    SNAPSHOT_MAGIC, rows, len(key_offsets) - 1, len(codes), len(keys), row_offsets[-1], int(time.time()),
+                ))
+                for section in (key_offsets, key_rows, row_offsets, array("I", codes), posting_offsets):
+                    section.tofile(out)
+                for code in codes:
+                    postings[code].tofile(out)
+                out.write(keys)
+                payloads.seek(0)
+                shutil.copyfileobj(payloads, out)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    seconds = time.perf_counter() - started
+    metrics.observe("snapshot", seconds)
+    logger.info(
+        "Snapshot %s: %d rows, %d names, %d trigrams, %.1f MB in %.2fs",
+        path, rows, len(key_offsets) - 1, len(codes), os.path.getsize(path) / 1e6, seconds,
+    )
+    return rows
+
+
+def refresh_snapshot(conn, path: str) -> None:
+    """write_snapshot after a commit; the load already succeeded, so a failure is only logged."""
+    try:
+        write_snapshot(conn, path)
+    except Exception as e:
+        logger.exception("Snapshot %s not written: %s", path, e)
+    finally:
+        conn.rollback()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load attestation lists from tmbm.ssv.uz into attestation_people.")
+    parser.add_argument(
+        "--concurrency", type=int, default=CONCURRENCY,
+        help=f"parallel HTTP requests (default {CONCURRENCY}, env ATTESTATION_CONCURRENCY)",
+    )
+    parser.add_argument(
+        "--rate", type=float, default=MAX_REQUESTS_PER_SECOND,
+        help=f"max requests per second per host (default {MAX_REQUESTS_PER_SECOND}, env ATTESTATION_RPS)",
+    )
+    parser.add_argument(
+        "--cache-dir", default=CACHE_DIR,
+        help="HTTP response cache directory (env ATTESTATION_CACHE_DIR)",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="disable conditional GETs and parse cache")
+    parser.add_argument(
+        "--checkpoint", default=CHECKPOINT_PATH, metavar="PATH",
+        help="journal of finished units for resuming an interrupted run "
+             "(default <cache-dir>/checkpoint.jsonl, env ATTESTATION_CHECKPOINT)",
+    )
+    parser.add_argument("--no-checkpoint", action="store_true", help="do not resume from or write a checkpoint")
+    parser.add_argument(
+        "--mode", choices=("incremental", "replace"), default=LOAD_MODE,
+        help="incremental: diff against a staging table; replace: DELETE + full reinsert (env ATTESTATION_LOAD_MODE)",
+    )
+    parser.add_argument(
+        "--loader", choices=("copy", "values"), default=LOADER,
+        help="copy: stream via COPY FROM STDIN; values: execute_values (env ATTESTATION_LOADER)",
+    )
+    parser.add_argument(
+        "--html-backend", choices=("auto",) + HTML_BACKENDS, default=HTML_BACKEND,
+        help="HTML parser: lxml fast path, bs4 (anchors-only category pages), bs4-full (env ATTESTATION_HTML_BACKEND)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=PARSE_WORKERS,
+        help="processes for parsing post HTML, 0/1 = in-process (env ATTESTATION_WORKERS)",
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="keep running: poll category pages and insert only newly published posts (stop with SIGTERM)",
+    )
+    parser.add_argument(
+        "--watch-min", type=float, default=WATCH_MIN_INTERVAL, metavar="SECONDS",
+        help=f"shortest poll interval (default {WATCH_MIN_INTERVAL:g}, env ATTESTATION_WATCH_MIN_INTERVAL)",
+    )
+    parser.add_argument(
+        "--watch-max", type=float, default=WATCH_MAX_INTERVAL, metavar="SECONDS",
+        help=f"longest poll interval (default {WATCH_MAX_INTERVAL:g}, env ATTESTATION_WATCH_MAX_INTERVAL)",
+    )
+    parser.add_argument(
+        "--serve", metavar="ADDR",
+        help="run as a resident worker on HOST:PORT or unix:/path.sock; "
+             "POST /refresh starts a crawl, GET /status reports it",
+    )
+    parser.add_argument(
+        "--metrics-json", default=METRICS_JSON, metavar="PATH",
+        help="write the run summary (stage timings, counters) as JSON (env ATTESTATION_METRICS_JSON)",
+    )
+    parser.add_argument(
+        "--metrics-prom", default=METRICS_PROM, metavar="PATH",
+        help="write a node_exporter textfile-collector .prom file (env ATTESTATION_METRICS_PROM)",
+    )
+    parser.add_argument(
+        "--snapshot", default=SNAPSHOT_PATH, metavar="PATH",
+        help="after a successful load, write the mmap lookup snapshot for attestation_lookup.py (env ATTESTATION_SNAPSHOT)",
+    )
+    parser.add_argument(
+        "--check-parity", nargs="+", metavar="HTML",
+        help="compare all HTML backends on saved pages and exit (no DB needed)",
+    )
+    return parser.parse_args(argv)
+
+
+# Выставляется по SIGTERM: исключение внутри COPY psycopg2 превращает в свою ошибку, поэтому статус берём отсюда.
+stop_requested = threading.Event()
+
+
+def _terminate(signum, frame) -> None:
+    """SIGTERM (Node kills the parser on timeout) -> SystemExit, so cleanup and the summary still run."""
+    logger.error("Received signal %d, stopping", signum)
+    stop_requested.set()
+    raise SystemExit(128 + signum)
+
+
+def require_database_url() -> str:
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url or not database_url.strip():
+        logger.error("DATABASE_URL is not set. Exit.")
+        raise SystemExit(1)
+    return database_url
+
+
+def connect_db():
+    """psycopg2 connection to DATABASE_URL; logs and exits with 1 when it cannot connect."""
+    database_url = require_database_url()
+    try:
+        return psycopg2.connect(database_url)
+    except Exception as e:
+        logger.error("DB connect failed: %s", e)
+        raise SystemExit(1)
+
+
+def next_watch_interval(interval: float, found_new: bool, min_interval: float, max_interval: float) -> float:
+    """New posts -> poll again soon; quiet poll -> back off towards max_interval."""
+    if found_new:
+        return min_interval
+    return min(max_interval, max(interval, min_interval) * WATCH_BACKOFF)
+
+
+def settle_watch_posts(
+    new_posts: list[str],
+    failed_urls: list[str],
+    seen: set[str],
+    failures: dict[str, int],
+) -> list[str]:
+    """
+    Account for the new posts of one watch cycle and return the ones that loaded. Loaded posts
+    join `seen`; a post that failed WATCH_MAX_POST_RETRIES cycles in a row joins it too, so it
+    is not fetched again by this process. `failures` counts consecutive failed cycles per URL.
+    """
+    failed = set(failed_urls)
+    loaded = []
+    for url in dict.fromkeys(new_posts):
+        if url not in failed:
+            loaded.append(url)
+            seen.add(url)
+            failures.pop(url, None)
+            continue
+        failures[url] = failures.get(url, 0) + 1
+        if failures[url] >= WATCH_MAX_POST_RETRIES:
+            logger.warning("Watch: giving up on %s after %d failed cycles", url, failures.pop(url))
+            metrics.inc("watch_posts_given_up")
+            seen.add(url)
+    return loaded
+
+
+def watch(args: argparse.Namespace) -> str:
+    """
+    Poll category pages on an adaptive interval and ingest only posts whose URL is not stored yet.
+    Category pages are cheap with the HTTP cache (conditional GETs); rows are only inserted, the
+    regular full run still removes withdrawn lists. Each cycle is its own transaction and writes
+    its own metrics summary. Runs until SIGTERM.
+    """
+    database_url = require_database_url()
+    session = get_session(args.concurrency)
+    limiter = HostRateLimiter(args.rate, burst=max(args.concurrency, 1))
+    cache = None if args.no_cache else HttpCache(args.cache_dir)
+    backend = resolve_html_backend(args.html_backend)
+    logger.info("Watch mode: HTML backend %s, interval %.0f..%.0fs", backend, args.watch_min, args.watch_max)
+    seen: set[str] = set()  # posts fetched by this process, including ones without table rows
+    post_failures: dict[str, int] = {}
+    interval = args.watch_min
+    while True:
+        metrics.reset()
+        status = "failed"
+        new_posts: list[str] = []
+        failed_urls: list[str] = []
+        loaded: list[str] = []
+        try:
+            conn = psycopg2.connect(database_url)
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT DISTINCT unnest(source_urls) FROM attestation_people")
+                    known = seen | {r[0] for r in cur.fetchall()}
+
+                    def skip_post(url: str) -> bool:
+                        if url in known:
+                            return True
+                        new_posts.append(url)
+                        return False
+
+                    rows = crawl_rows(
+                        session, limiter, args.concurrency, cache, backend, failed_urls, args.workers,
+                        skip_post=skip_post,
+                    )
+                    count = write_rows_incremental(cur, rows, failed_urls, args.loader, delete_missing=False)
+                conn.commit()
+                if count and args.snapshot:
+                    refresh_snapshot(conn, args.snapshot)
+            finally:
+                conn.close()
+            loaded = settle_watch_posts(new_posts, failed_urls, seen, post_failures)
+            status = "ok" if count else "empty"
+            logger.info("Watch: %d new posts, %d rows, %d failed pages", len(loaded), count, len(failed_urls))
+        except Exception as e:
+            logger.exception("Watch cycle failed: %s", e)
+        # посты, которые не загрузились, не считаются новыми: иначе интервал никогда не растёт
+        interval = next_watch_interval(interval, bool(loaded), args.watch_min, args.watch_max)
+        write_run_summary(
+            status, args.metrics_json, args.metrics_prom,
+            mode="watch", new_posts=len(loaded), next_poll_seconds=round(interval, 1),
+        )
+        logger.info("Watch: next poll in %.0fs", interval)
+        stop_requested.wait(interval)
+        if stop_requested.is_set():
+            return "terminated"
+
+
+class ParserWorker:
+    """
+    Job state of the resident worker. At most one refresh runs at a time: a /refresh that
+    arrives while a job is running joins it instead of starting a second crawl.
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.started = datetime.now(timezone.utc).isoformat()
+        self._lock = threading.Lock()
+        self._jobs = 0
+        self._running: dict | None = None
+        self._last: dict | None = None
+
+    def refresh(self) -> tuple[dict, bool]:
+        """Start a job unless one is running; returns (job, started)."""
+        with self._lock:
+            if self._running is not None:
+                return dict(self._running), False
+            self._jobs += 1
+            job = {
+                "id": self._jobs,
+                "state": "running",
+                "status": None,
+                "started_at": datetime.now(timezone.utc).isoformat(),
+            }
+            self._running = job
+        # daemon: SIGTERM stops the worker without waiting; the open transaction is rolled back
+        # and the next job resumes from the checkpoint.
+        threading.Thread(target=self._run, args=(job,), name=f"refresh-{job['id']}", daemon=True).start()
+        logger.info("Worker: refresh job %d started", job["id"])
+        return dict(job), True
+
+    def _run(self, job: dict) -> None:
+        metrics.reset()
+        status = "failed"
+        try:
+            status = run(self.args)
+        except SystemExit:
+            pass  # run() has logged the reason
+        except Exception as e:
+            logger.exception("Refresh job %d failed: %s", job["id"], e)
+        summary = write_run_summary(
+            status, self.args.metrics_json, self.args.metrics_prom, mode=self.args.mode, job=job["id"],
+        )
+        with self._lock:
+            job.update(
+                state="finished",
+                status=status,
+                finished_at=summary["finished_at"],
+                duration_seconds=summary["duration_seconds"],
+                rows=int(metrics.total("rows_loaded")),
+                failures=len(summary["failures"]),
+            )
+            self._last, self._running = job, None
+        logger.info("Worker: refresh job %d finished: %s", job["id"], status)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "started_at": self.started,
+                "jobs": self._jobs,
+                "running": dict(self._running) if self._running else None,
+                "last": dict(self._last) if self._last else None,
+            }
+
+
+class _WorkerHandler(BaseHTTPRequestHandler):
+    """POST /refresh -> start or join a job; GET /status -> running and last job."""
+
+    server_version = "attestation-worker/1.0"
+
+    def _reply(self, code: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if urlparse(self.path).path == "/status":
+            self._reply(200, self.server.worker.status())
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if urlparse(self.path).path == "/refresh":
+            job, started = self.server.worker.refresh()
+            self._reply(202 if started else 200, {"job": job, "started": started})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("Worker HTTP: " + format, *args)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)  # BaseHTTPRequestHandler expects a (host, port) pair
+
+
+def serve(args: argparse.Namespace) -> None:
+    """Resident worker: imports and connections stay warm, the API triggers refreshes over HTTP."""
+    require_database_url()
+    address = args.serve
+    if address.startswith("unix:"):
+        path = address[len("unix:"):]
+        if os.path.exists(path):
+            os.unlink(path)  # stale socket of a previous worker
+        server = _UnixHTTPServer(path, _WorkerHandler)
+        os.chmod(path, 0o660)
+    else:
+        path = None
+        host, _, port = address.rpartition(":")
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), _WorkerHandler)
+        server.daemon_threads = True
+    server.worker = ParserWorker(args)
+    logger.info("Worker listening on %s", address)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if path and os.path.exists(path):
+            os.unlink(path)
+
+
+def run(args: argparse.Namespace) -> str:
+    """One crawl + load; returns the run status ("ok" or "empty"), raises SystemExit(1) on failure."""
+    conn = connect_db()
+    session = get_session(args.concurrency)
+    limiter = HostRateLimiter(args.rate, burst=max(args.concurrency, 1))
+    started = time.monotonic()
+    cache = None if args.no_cache else HttpCache(args.cache_dir)
+    backend = resolve_html_backend(args.html_backend)
+    logger.info("HTML backend: %s", backend)
+    failed_urls: list[str] = []
+    checkpoint = None
+    if not args.no_checkpoint:
+        checkpoint = CrawlCheckpoint(args.checkpoint or os.path.join(args.cache_dir, "checkpoint.jsonl"))
+    rows = crawl_rows(session, limiter, args.concurrency, cache, backend, failed_urls, args.workers, checkpoint)
+
+    try:
+        with conn.cursor() as cur:
+            ensure_search_indexes(cur)
+            if args.mode == "replace":
+                count = write_rows_replace(cur, rows, args.loader)
+            else:
+                count = write_rows_incremental(cur, rows, failed_urls, args.loader)
+            backfill_name_keys(cur)
+            logger.info("Crawl finished in %.1fs, total rows: %d", time.monotonic() - started, count)
+            if not count:
+                logger.warning("No rows to insert.")
+                conn.rollback()
+                return "empty"
             conn.commit()
             logger.info("Inserted attestation rows successfully.")
+            if checkpoint:
+                checkpoint.discard()
+        if args.snapshot:
+            refresh_snapshot(conn, args.snapshot)
+        return "ok"
     except Exception as e:
         logger.exception("DB write failed: %s", e)
         conn.rollback()
         raise SystemExit(1)
     finally:
         conn.close()
+        if checkpoint:
+            checkpoint.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    if args.check_parity:
+        raise SystemExit(0 if check_backend_parity(args.check_parity) else 1)
+
+    stop_requested.clear()
+    signal.signal(signal.SIGTERM, _terminate)
+    if args.serve:
+        serve(args)  # every job writes its own summary
+        return
+
+    metrics.reset()
+    status = "failed"
+    try:
+        status = watch(args) if args.watch else run(args)
+    finally:
+        if stop_requested.is_set():
+            status = "terminated"
+        write_run_summary(
+            status, args.metrics_json, args.metrics_prom,
+            mode=args.mode, loader=args.loader, workers=args.workers,
+        )
 
 
 if __name__ == "__main__":
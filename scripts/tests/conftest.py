@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Скрипты не пакет: тесты импортируют parser_attestation как сами скрипты, из scripts/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,177 @@
+import glob
+import logging
+import os
+import signal
+import time
+
+import pytest
+
+import parser_attestation as parser
+
+BACKENDS = parser.HTML_BACKENDS
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "attestation")
+
+NO_HEADER_ROWS = [
+    ("1", "Каримов Али", "Терапия", "12.03.2026", "09:00"),
+    ("2", "Набиев Олим", "Хирургия", "12.03.2026", "10:00"),
+    ("3", "Исмиров Ҳасан", "Терапия", "13.03.2026", "09:00"),
+    ("4", "Юсупов Бек", "Педиатрия", "13.03.2026", "11:00"),
+    ("5", "Расулов Дилшод", "Неврология", "14.03.2026", "09:30"),
+]
+
+
+def table_html(rows, header=None, header_tag="th") -> str:
+    trs = []
+    if header:
+        trs.append("<tr>" + "".join(f"<{header_tag}>{c}</{header_tag}>" for c in header) + "</tr>")
+    trs.extend("<tr>" + "".join(f"<td>{c}</td>" for c in row) + "</tr>" for row in rows)
+    return "<html><body><table>" + "".join(trs) + "</table></body></html>"
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_name_with_header_keyword_is_not_a_header(backend):
+    # «Исмиров» contains the header keyword «исми»: the row must stay data, and so must the rows above it.
+    rows, _region = parser.parse_post(table_html(NO_HEADER_ROWS), backend)
+    assert [row["full_name"] for row in rows] == [row[1] for row in NO_HEADER_ROWS]
+    assert rows[2]["exam_date"] == "13.03.2026"
+    assert rows[2]["exam_time"] == "09:00"
+
+
+@pytest.mark.parametrize("header_tag", ("th", "td"))
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_header_row_sets_columns(backend, header_tag):
+    header = ("№", "Ф.И.Ш", "Мутахассислиги", "Сана", "Вақт")
+    rows, _region = parser.parse_post(table_html(NO_HEADER_ROWS, header, header_tag), backend)
+    assert len(rows) == len(NO_HEADER_ROWS)
+    assert rows[0] == {
+        "full_name": "Каримов Али",
+        "specialty": "Терапия",
+        "region": None,
+        "exam_date": "12.03.2026",
+        "exam_time": "09:00",
+    }
+
+
+def test_parsed_cache_is_dropped_when_parse_version_changes(tmp_path, monkeypatch):
+    cache = parser.HttpCache(str(tmp_path))
+    url = "https://tmbm.ssv.uz/post/1"
+    rows = [{"full_name": "Каримов Али"}]
+    cache.store_parsed(url, "digest", rows, "Тошкент")
+    assert cache.load_parsed(url, "digest") == (rows, "Тошкент")
+    assert cache.load_parsed(url, "other") is None
+
+    monkeypatch.setattr(parser, "PARSE_VERSION", parser.PARSE_VERSION + 1)
+    assert cache.load_parsed(url, "digest") is None
+
+
+@pytest.mark.parametrize("name", ("Қодиров Ҳасан", "Qodirov Hasan", "Kodirov Khasan", "Кодиров Хасан"))
+def test_name_key_folds_scripts_and_transliterations(name):
+    assert parser.name_key(name) == "kodirov hasan"
+
+
+def test_name_key_does_not_fold_vowels():
+    assert parser.name_key("Kadirov Khasan") == "kadirov hasan"
+    assert parser.name_key("Karimov Ali") != parser.name_key("Korimov Ali")
+
+
+@pytest.mark.parametrize(
+    "cell, expected",
+    (("09:00-12:00", "09:00"), ("9:30", "09:30"), ("23:59", "23:59"), ("24:00", None), ("12:61", None), ("", None)),
+)
+def test_parse_exam_time(cell, expected):
+    # те же правила, что у pg_temp.attestation_exam_time в миграции type_attestation_exam_dates
+    parsed = parser.parse_exam_time(cell)
+    assert (parsed.strftime("%H:%M") if parsed else None) == expected
+
+
+def test_backends_agree_on_fixtures():
+    paths = sorted(glob.glob(os.path.join(FIXTURES, "*.html")))
+    assert paths
+    assert parser.check_backend_parity(paths)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("html", ("", "  \n", "<!-- пусто -->"))
+def test_empty_page_is_not_an_error(backend, html, caplog):
+    assert parser.parse_post(html, backend) == ([], None)
+    assert parser.parse_category_links(html, "https://tmbm.ssv.uz/", backend=backend) == []
+    assert not [r for r in caplog.records if r.levelno >= logging.ERROR]
+
+
+def test_cache_prune_removes_only_stale_entries(tmp_path):
+    cache = parser.HttpCache(str(tmp_path))
+    old_url, fresh_url = "https://tmbm.ssv.uz/post/view/1", "https://tmbm.ssv.uz/post/view/2"
+    for url in (old_url, fresh_url):
+        cache._write(cache._path(url, ".html"), "<html></html>")
+        cache._write(cache._path(url, ".json"), "{}")
+        cache.store_parsed(url, "digest", [], None)
+    journal = tmp_path / "checkpoint.jsonl"
+    journal.write_text("{}\n")
+    month_ago = time.time() - 31 * 86400
+    for path in [*tmp_path.iterdir()]:
+        os.utime(path, (month_ago, month_ago))
+    assert cache.load_body(fresh_url) == "<html></html>"  # чтение продлевает запись
+
+    assert cache.prune(30) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        [os.path.basename(cache._path(fresh_url, s)) for s in parser.CACHE_SUFFIXES] + ["checkpoint.jsonl"]
+    )
+
+
+def test_watch_gives_up_on_a_post_that_keeps_failing(monkeypatch):
+    monkeypatch.setattr(parser, "WATCH_MAX_POST_RETRIES", 2)
+    good, bad = "https://tmbm.ssv.uz/post/view/1", "https://tmbm.ssv.uz/post/view/2"
+    seen, failures = set(), {}
+
+    assert parser.settle_watch_posts([good, bad], [bad], seen, failures) == [good]
+    assert seen == {good} and failures == {bad: 1}
+    # только сбойный пост: цикл не считается нашедшим новое, интервал растёт
+    assert parser.settle_watch_posts([bad], [bad], seen, failures) == []
+    assert parser.next_watch_interval(120, False, 120, 1800) > 120
+    assert seen == {good, bad} and failures == {}
+
+
+class _KillingPool(parser.ProcessPoolExecutor):
+    """
+    Process pool whose worker is SIGKILLed right after the first submit. Later parses stay queued
+    behind it (as in a busy pool) until shutdown(cancel_futures=True) cancels them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queued = []
+
+    def submit(self, fn, /, *args, **kwargs):
+        if self._processes:
+            future = parser.Future()
+            self.queued.append(future)
+            return future
+        future = super().submit(fn, *args, **kwargs)
+        os.kill(next(iter(self._processes)), signal.SIGKILL)
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        if cancel_futures:
+            for future in self.queued:
+                future.cancel()
+        super().shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def test_killed_parse_worker_does_not_lose_queued_posts(monkeypatch):
+    base = "https://tmbm.ssv.uz"
+    posts = [f"{base}/post/view/{i}" for i in range(12)]
+    pages = {f"{base}/category": "".join(f'<a href="{url}">01.03.2026 list</a>' for url in posts)}
+    for i, url in enumerate(posts):
+        pages[url] = table_html([(n, f"{name} {i}", *rest) for n, name, *rest in NO_HEADER_ROWS])
+    source = dict(parser.SOURCES[0], url=f"{base}/category")
+    monkeypatch.setattr(parser, "iter_category_units", lambda: [(source, None, f"{base}/category")])
+    monkeypatch.setattr(parser, "fetch", lambda session, url, limiter=None, cache=None: pages[url])
+    monkeypatch.setattr(parser, "MAX_POSTS_PER_CATEGORY", len(posts))
+    monkeypatch.setattr(parser, "ProcessPoolExecutor", _KillingPool)
+
+    failed_urls = []
+    rows = list(parser.crawl_rows(None, None, 4, backend="bs4-full", failed_urls=failed_urls, workers=2))
+
+    assert failed_urls == []
+    assert len(rows) == len(posts) * len(NO_HEADER_ROWS)
+    assert {row.source_url for row in rows} == set(posts)